@@ -0,0 +1,191 @@
+"""
+Latency percentiles and throughput for the direct and *_optimize endpoints.
+
+  python benchmarks/endpoint_bench.py --requests 200 --out bench_endpoints.json
+  python benchmarks/endpoint_bench.py --target http --serve --concurrency 4
+  python benchmarks/endpoint_bench.py --target http --url http://localhost:3000 --compare bench_endpoints.json
+
+Run from the repo root so the models/ paths resolve.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from service import STAGE_NAMES  # noqa: E402
+from payloads import random_config  # noqa: E402
+
+PERCENTILES = (50, 95, 99)
+
+
+class InProcessClient:
+    """Calls the AquaSmartService methods directly (no HTTP, no serialization)."""
+
+    def __init__(self):
+        from service import AquaSmartService
+        self.svc = AquaSmartService.inner()
+
+    def call(self, endpoint: str, body: dict) -> dict:
+        return getattr(self.svc, endpoint)(body)
+
+
+class HttpClient:
+    """POSTs {"request_json": body} to a running BentoML server."""
+
+    def __init__(self, url: str, timeout: float = 60.0):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def call(self, endpoint: str, body: dict) -> dict:
+        data = json.dumps({"request_json": body}).encode()
+        req = urllib.request.Request(f"{self.url}/{endpoint}", data=data, headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+            return json.loads(resp.read())
+
+
+def start_server(port: int, ready_timeout: float = 120.0) -> subprocess.Popen:
+    proc = subprocess.Popen(
+        ["bentoml", "serve", "service:AquaSmartService", "--port", str(port)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + ready_timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"bentoml serve exited with code {proc.returncode}")
+        try:
+            with urllib.request.urlopen(f"http://localhost:{port}/readyz", timeout=1.0):
+                return proc
+        except OSError:
+            time.sleep(0.5)
+    proc.terminate()
+    raise RuntimeError("server did not become ready in time")
+
+
+def build_cases(stages, n_samples_list, top_k_list) -> list:
+    cases = [{"endpoint": stage, "stage": stage} for stage in stages]
+    for stage in stages:
+        for n_samples in n_samples_list:
+            for top_k in top_k_list:
+                cases.append({"endpoint": f"{stage}_optimize", "stage": stage, "n_samples": n_samples, "top_k": top_k})
+    return cases
+
+
+def request_body(case: dict, rng: np.random.Generator, seed: int) -> dict:
+    config = random_config(case["stage"], rng)
+    if "n_samples" not in case:
+        return config
+    return {"current_config": config, "n_samples": case["n_samples"], "top_k": case["top_k"], "seed": seed}
+
+
+def run_case(client, case: dict, n_requests: int, warmup: int, concurrency: int, seed: int) -> dict:
+    rng = np.random.default_rng(seed)
+    bodies = [request_body(case, rng, seed + i) for i in range(warmup + n_requests)]
+    for body in bodies[:warmup]:
+        client.call(case["endpoint"], body)
+
+    def timed(body):
+        start = time.perf_counter()
+        client.call(case["endpoint"], body)
+        return (time.perf_counter() - start) * 1000.0
+
+    start = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = list(pool.map(timed, bodies[warmup:]))
+    else:
+        latencies = [timed(body) for body in bodies[warmup:]]
+    wall = time.perf_counter() - start
+
+    lat = np.asarray(latencies)
+    row = dict(case)
+    row.update({f"p{p}_ms": float(np.percentile(lat, p)) for p in PERCENTILES})
+    row.update({
+        "mean_ms": float(lat.mean()),
+        "max_ms": float(lat.max()),
+        "requests": n_requests,
+        "throughput_rps": float(n_requests / wall) if wall > 0 else 0.0,
+    })
+    return row
+
+
+def case_key(row: dict) -> tuple:
+    return row["endpoint"], row.get("n_samples"), row.get("top_k")
+
+
+def print_comparison(results: list, baseline_path: str) -> None:
+    with open(baseline_path) as f:
+        baseline = {case_key(r): r for r in json.load(f)["results"]}
+    print(f"\nvs {baseline_path} (p50 / p95 / throughput, relative change)")
+    for row in results:
+        old = baseline.get(case_key(row))
+        if old is None:
+            continue
+        deltas = [(row[k] - old[k]) / old[k] * 100.0 if old[k] else 0.0 for k in ("p50_ms", "p95_ms", "throughput_rps")]
+        print(f"{row['endpoint']:<20} n={row.get('n_samples', '-')!s:<5} k={row.get('top_k', '-')!s:<3} "
+              f"p50 {deltas[0]:+6.1f}%  p95 {deltas[1]:+6.1f}%  rps {deltas[2]:+6.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", choices=["inprocess", "http"], default="inprocess")
+    parser.add_argument("--url", default=None, help="running server (http target); default starts nothing")
+    parser.add_argument("--serve", action="store_true", help="start `bentoml serve` locally for the http target")
+    parser.add_argument("--port", type=int, default=3000)
+    parser.add_argument("--stages", nargs="+", default=list(STAGE_NAMES))
+    parser.add_argument("--n-samples", nargs="+", type=int, default=[100, 500])
+    parser.add_argument("--top-k", nargs="+", type=int, default=[5])
+    parser.add_argument("--requests", type=int, default=100, help="timed requests per direct-endpoint case")
+    parser.add_argument("--optimize-requests", type=int, default=20, help="timed requests per optimize case")
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="write results as JSON")
+    parser.add_argument("--compare", default=None, help="earlier --out file to diff against")
+    args = parser.parse_args()
+
+    server = None
+    if args.target == "http":
+        if args.serve:
+            server = start_server(args.port)
+        client = HttpClient(args.url or f"http://localhost:{args.port}")
+    else:
+        client = InProcessClient()
+
+    results = []
+    try:
+        for case in build_cases(args.stages, args.n_samples, args.top_k):
+            n = args.optimize_requests if "n_samples" in case else args.requests
+            row = run_case(client, case, n, args.warmup, args.concurrency, args.seed)
+            results.append(row)
+            print(f"{row['endpoint']:<20} n={row.get('n_samples', '-')!s:<5} k={row.get('top_k', '-')!s:<3} "
+                  f"p50={row['p50_ms']:8.2f} p95={row['p95_ms']:8.2f} p99={row['p99_ms']:8.2f} ms  "
+                  f"{row['throughput_rps']:8.1f} req/s")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+    if args.compare:
+        print_comparison(results, args.compare)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({
+                "target": args.target,
+                "concurrency": args.concurrency,
+                "warmup": args.warmup,
+                "seed": args.seed,
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "results": results,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Multi-fidelity screening vs. full evaluation on the same seeds.
+
+  python benchmarks/fidelity_bench.py --fidelity 0.1 0.2 0.4 --keep 0.25 0.5 --repeats 10 --out bench_fidelity.json
+
+For every (fidelity, keep) setting it reports how often the screened top-k differs from the
+full-evaluation top-k, the mean overlap, the top-score gap and the speedup.
+Run from the repo root so the models/ paths resolve.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from service import AquaSmartService, STAGE_NAMES  # noqa: E402
+from payloads import random_config  # noqa: E402
+
+
+def candidate_key(c: dict) -> tuple:
+    return tuple(sorted((k, round(float(v), 9)) for k, v in c["inputs"].items()))
+
+
+def timed_optimize(svc, stage: str, config: dict, args, seed: int, screening=None):
+    info = {}
+    start = time.perf_counter()
+    best = svc._optimize(stage, config, args.mode, args.n_samples, args.top_k, seed=seed, info=info, screening=screening)
+    return best, (time.perf_counter() - start) * 1000.0, info
+
+
+def run_case(svc, stage: str, config: dict, args, seed: int, fidelity: float, keep: float, full) -> dict:
+    full_best, full_ms, _ = full
+    best, ms, info = timed_optimize(svc, stage, config, args, seed, screening={"fidelity": fidelity, "keep": keep})
+    full_keys = [candidate_key(c) for c in full_best]
+    keys = [candidate_key(c) for c in best]
+    return {
+        "identical_top_k": float(keys == full_keys),
+        "same_top_k_set": float(set(keys) == set(full_keys)),
+        "top_k_overlap": len(set(keys) & set(full_keys)) / max(1, len(full_keys)),
+        "top_score_gap": (full_best[0]["score"] - best[0]["score"]) if best and full_best else 0.0,
+        "full_evaluations": info["evaluations"],
+        "elapsed_ms": ms,
+        "speedup": full_ms / ms if ms > 0 else 0.0,
+    }
+
+
+def summarize(rows: list) -> dict:
+    return {key: float(np.mean([r[key] for r in rows])) for key in rows[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stages", nargs="+", default=list(STAGE_NAMES))
+    parser.add_argument("--n-samples", type=int, default=500)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--mode", default="balanced")
+    parser.add_argument("--fidelity", nargs="+", type=float, default=[0.1, 0.2, 0.4])
+    parser.add_argument("--keep", nargs="+", type=float, default=[0.25, 0.5])
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--out", default=None, help="write results as JSON")
+    args = parser.parse_args()
+
+    svc = AquaSmartService.inner()
+    svc.cache = None
+    results = []
+    for stage in args.stages:
+        configs = [random_config(stage, np.random.default_rng(r)) for r in range(args.repeats)]
+        # surrogate compile happens once per stage; keep it out of the timings
+        svc._surrogate(stage, min(args.fidelity))
+        full = [timed_optimize(svc, stage, configs[r], args, r) for r in range(args.repeats)]
+        for fidelity in args.fidelity:
+            for keep in args.keep:
+                rows = [run_case(svc, stage, configs[r], args, r, fidelity, keep, full[r]) for r in range(args.repeats)]
+                summary = summarize(rows)
+                results.append({"stage": stage, "fidelity": fidelity, "keep": keep, **summary})
+                print(f"{stage:<11} fidelity={fidelity:<4} keep={keep:<4} differs={1 - summary['identical_top_k']:5.0%} "
+                      f"set_differs={1 - summary['same_top_k_set']:5.0%} overlap={summary['top_k_overlap']:.2f} "
+                      f"gap={summary['top_score_gap']:6.3f} speedup={summary['speedup']:.2f}x")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"mode": args.mode, "n_samples": args.n_samples, "top_k": args.top_k, "repeats": args.repeats,
+                       "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Compares optimizer algorithms on the same starting configs and seeds.
+
+  python benchmarks/optimizer_bench.py --n-samples 100 500 --repeats 10 --out bench_optimizer.json
+
+Run from the repo root so the models/ paths resolve.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from service import AquaSmartService  # noqa: E402
+from payloads import random_config  # noqa: E402
+
+
+def run_case(svc, stage: str, config: dict, mode: str, n_samples: int, top_k: int, seed: int, algorithm: str, **kwargs) -> dict:
+    info = {}
+    start = time.perf_counter()
+    best = svc._optimize(stage, config, mode, n_samples, top_k, seed=seed, algorithm=algorithm, info=info, **kwargs)
+    elapsed = time.perf_counter() - start
+    feasible = [c for c in best if c["feasible"]]
+    return {
+        "evaluations": info.get("evaluations", 0),
+        "elapsed_ms": elapsed * 1000.0,
+        "top_score": max((c["score"] for c in best), default=0.0),
+        "mean_top_k_score": float(np.mean([c["score"] for c in best])) if best else 0.0,
+        "feasible_in_top_k": len(feasible),
+    }
+
+
+def summarize(rows: list) -> dict:
+    return {key: float(np.mean([r[key] for r in rows])) for key in rows[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stages", nargs="+", default=["primary", "biological", "tertiary"])
+    parser.add_argument("--n-samples", nargs="+", type=int, default=[100, 500])
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--mode", default="balanced")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--algorithms", nargs="+", default=["random", "cem"])
+    parser.add_argument("--out", default=None, help="write results as JSON")
+    args = parser.parse_args()
+
+    svc = AquaSmartService.inner()
+    results = []
+    for stage in args.stages:
+        for n_samples in args.n_samples:
+            for algorithm in args.algorithms:
+                rows = []
+                for r in range(args.repeats):
+                    config = random_config(stage, np.random.default_rng(r))
+                    rows.append(run_case(svc, stage, config, args.mode, n_samples, args.top_k, r, algorithm))
+                summary = summarize(rows)
+                results.append({"stage": stage, "n_samples": n_samples, "algorithm": algorithm, **summary})
+                print(f"{stage:<11} n={n_samples:<5} {algorithm:<8} evals={summary['evaluations']:8.0f} "
+                      f"ms={summary['elapsed_ms']:8.1f} top={summary['top_score']:6.2f} "
+                      f"top_k_mean={summary['mean_top_k_score']:6.2f} feasible={summary['feasible_in_top_k']:.1f}/{args.top_k}")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"mode": args.mode, "top_k": args.top_k, "repeats": args.repeats, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
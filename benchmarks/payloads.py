@@ -0,0 +1,46 @@
+# benchmarks/payloads.py
+# Synthetic stage payloads built from the service's feature columns and optimization bounds.
+import numpy as np
+
+from service import STAGES
+
+# typical influent / fixed plant values (not covered by the *_OPT_BOUNDS)
+INFLUENT = {
+    "primary": {
+        "Q_in_mld": 50.0, "temp_C": 25.0, "pH": 7.2, "TSS_in_mgL": 250.0, "BOD5_in_mgL": 200.0,
+        "COD_in_mgL": 450.0, "oil_grease_in_mgL": 50.0, "peak_factor": 2.0, "screen_type": 1,
+        "screen_angle_deg": 60.0, "grit_type": 1, "clarifier_type": 0, "side_water_depth_m": 3.5,
+        "weir_length_m": 60.0, "saturator_retention_time_min": 3.0,
+    },
+    "biological": {
+        "Q_bio_mld": 48.0, "temp_C": 25.0, "pH": 7.2, "TSS_in_bio_mgL": 80.0, "BOD5_in_bio_mgL": 120.0,
+        "COD_in_bio_mgL": 260.0, "NH4_in_mgL": 30.0, "NO3_in_mgL": 2.0, "F_M_ratio_kgkgd": 0.3,
+    },
+    "tertiary": {
+        "Q_ter_mld": 46.0, "temp_C": 25.0, "pH_bulk": 7.3, "TSS_after_bio_mgL": 20.0, "turbidity_in_NTU": 8.0,
+        "BOD_in_ter_mgL": 15.0, "COD_in_ter_mgL": 60.0, "NH4_in_ter_mgL": 3.0, "NO3_in_ter_mgL": 12.0,
+        "TP_in_ter_mgL": 2.0, "Ecoli_in_CFU_100mL": 100000.0, "micropollutant_in_ugL": 5.0, "flux_LMH": 40.0,
+    },
+}
+
+
+def midpoint_config(stage: str) -> dict:
+    """Influent values plus the midpoint of every optimization bound."""
+    cfg = dict(INFLUENT[stage])
+    for key, (low, high) in STAGES[stage]["bounds"].items():
+        mid = (low + high) / 2
+        cfg[key] = int(round(mid)) if isinstance(low, int) and isinstance(high, int) else mid
+    return cfg
+
+
+def random_config(stage: str, rng: np.random.Generator, influent_jitter: float = 0.2) -> dict:
+    """Influent jittered by +/- influent_jitter, controllable settings uniform within bounds."""
+    cfg = {}
+    for key, value in INFLUENT[stage].items():
+        cfg[key] = value if isinstance(value, int) else float(value * rng.uniform(1 - influent_jitter, 1 + influent_jitter))
+    for key, (low, high) in STAGES[stage]["bounds"].items():
+        if isinstance(low, int) and isinstance(high, int):
+            cfg[key] = int(rng.integers(low, high + 1))
+        else:
+            cfg[key] = float(rng.uniform(low, high))
+    return cfg
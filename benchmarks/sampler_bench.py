@@ -0,0 +1,96 @@
+"""
+Random vs. quasi-Monte Carlo (Sobol / Latin hypercube) candidate sampling.
+
+  python benchmarks/sampler_bench.py --n-samples 64 128 256 512 --reference-n 512 --repeats 10 --out bench_sampler.json
+
+Each case evaluates one narrow-scale candidate set (no progressive fallback) and records the
+mean top-k score and the feasible hit rate. For every QMC sampler the summary reports the
+smallest n whose results match the random sampler at --reference-n.
+Run from the repo root so the models/ paths resolve.
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from service import AquaSmartService, OPT_SAMPLERS, STAGE_NAMES  # noqa: E402
+from payloads import random_config  # noqa: E402
+
+
+def run_case(svc, stage: str, config: dict, mode: str, n_samples: int, top_k: int, seed: int, sampler: str, scale: float) -> dict:
+    frame = svc._run_candidates(stage, config, mode, scale, n_samples, np.random.SeedSequence(seed), sampler=sampler)
+    top = frame.top(top_k, frame.feasible)
+    if not len(top):
+        top = frame.top(top_k)
+    return {
+        "mean_top_k_score": float(frame.scores[top].mean()) if len(top) else 0.0,
+        "top_score": float(frame.scores[top[0]]) if len(top) else 0.0,
+        "feasible_rate": float(frame.feasible.mean()) if len(frame) else 0.0,
+    }
+
+
+def summarize(rows: list) -> dict:
+    return {key: float(np.mean([r[key] for r in rows])) for key in rows[0]}
+
+
+def samples_to_match(results: list, stage: str, sampler: str, reference: dict, tolerance: float):
+    # smallest n at which the sampler reaches the reference top-k score and feasible rate (within tolerance)
+    for row in sorted((r for r in results if r["stage"] == stage and r["sampler"] == sampler), key=lambda r: r["n_samples"]):
+        if (row["mean_top_k_score"] >= reference["mean_top_k_score"] * (1.0 - tolerance)
+                and row["feasible_rate"] >= reference["feasible_rate"] * (1.0 - tolerance)):
+            return row["n_samples"]
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stages", nargs="+", default=list(STAGE_NAMES))
+    parser.add_argument("--n-samples", nargs="+", type=int, default=[64, 128, 256, 512])
+    parser.add_argument("--reference-n", type=int, default=512, help="random-sampler n the others must match")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--mode", default="balanced")
+    parser.add_argument("--scale", type=float, default=0.25, help="local search scale (narrow phase = 0.25)")
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--samplers", nargs="+", default=list(OPT_SAMPLERS))
+    parser.add_argument("--tolerance", type=float, default=0.01, help="relative shortfall still counted as a match")
+    parser.add_argument("--out", default=None, help="write results as JSON")
+    args = parser.parse_args()
+
+    svc = AquaSmartService.inner()
+    svc.cache = None
+    n_values = sorted(set(args.n_samples) | {args.reference_n})
+    results = []
+    for stage in args.stages:
+        for sampler in args.samplers:
+            for n_samples in n_values:
+                rows = []
+                for r in range(args.repeats):
+                    config = random_config(stage, np.random.default_rng(r))
+                    rows.append(run_case(svc, stage, config, args.mode, n_samples, args.top_k, r, sampler, args.scale))
+                summary = summarize(rows)
+                results.append({"stage": stage, "sampler": sampler, "n_samples": n_samples, **summary})
+                print(f"{stage:<11} {sampler:<7} n={n_samples:<5} top={summary['top_score']:6.2f} "
+                      f"top_k_mean={summary['mean_top_k_score']:6.2f} feasible_rate={summary['feasible_rate']:.3f}")
+
+    matches = []
+    if "random" in args.samplers:
+        print(f"\nsamples needed to match random @ n={args.reference_n}")
+        for stage in args.stages:
+            reference = next(r for r in results if r["stage"] == stage and r["sampler"] == "random" and r["n_samples"] == args.reference_n)
+            for sampler in args.samplers:
+                n = samples_to_match(results, stage, sampler, reference, args.tolerance)
+                matches.append({"stage": stage, "sampler": sampler, "samples_to_match": n})
+                print(f"{stage:<11} {sampler:<7} {n if n is not None else f'> {max(n_values)}'}")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"mode": args.mode, "top_k": args.top_k, "scale": args.scale, "repeats": args.repeats,
+                       "reference_n": args.reference_n, "tolerance": args.tolerance, "results": results, "samples_to_match": matches}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""
+Offline bulk scoring: stream JSONL or CSV rows (optionally .gz/.bz2/.xz) through one stage model
+without the HTTP layer.
+
+  python bulk_score.py --stage primary --input history.jsonl.gz --output scored.jsonl.gz
+  python bulk_score.py --stage tertiary --input plant.csv --output scored.csv --id-column timestamp --recommendations
+
+Rows are read CHUNK_ROWS at a time; each chunk is parsed, predicted and serialized in a worker
+process (models loaded once per worker, see AQUASMART_SHARED_MODELS to share them via mmap).
+At most 2 chunks per worker are in flight and results are written in input order, so memory
+stays bounded for any input size. JSONL rows are stage payloads (optionally {"request_json": ...});
+CSV needs a header row and must not contain quoted newlines. Missing feature values count as 0.0,
+as in the API. Run from the repo root so the models/ paths resolve.
+
+A malformed row (bad JSON, not an object, non-numeric feature value) stops the run with its row
+number; with --skip-errors it is reported on stderr and left out of the output instead. Row numbers
+count data rows from 0, like the "row" output column.
+"""
+import argparse
+import bz2
+import csv
+import gzip
+import io
+import itertools
+import json
+import lzma
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from service import STAGES, STAGE_NAMES, _build_feature_matrix, _columns, _load_stage_model, _unwrap_payload, \
+    generate_recommendations_batch
+
+CHUNK_ROWS = 20000
+COMPRESSED = {".gz": gzip.open, ".bz2": bz2.open, ".xz": lzma.open}
+
+# per-process state, filled by init_worker
+_WORKER = {}
+
+
+class RowError(ValueError):
+    """A malformed input row, raised when --skip-errors is off."""
+
+
+def open_text(path: str, mode: str):
+    # "-" is stdin/stdout; compression is picked from the extension
+    if path == "-":
+        return sys.stdin if mode == "r" else sys.stdout
+    opener = COMPRESSED.get(os.path.splitext(path)[1], open)
+    return opener(path, mode + "t", encoding="utf-8", newline="")
+
+
+def file_format(path: str, given) -> str:
+    if given:
+        return given
+    root, ext = os.path.splitext(path)
+    if ext in COMPRESSED:
+        ext = os.path.splitext(root)[1]
+    return "csv" if ext == ".csv" else "jsonl"
+
+
+def read_chunks(f, fmt: str, chunk_rows: int):
+    # -> (first row number, csv header or None, raw records); parsing is left to the workers
+    header = None
+    if fmt == "csv":
+        records = csv.reader(f)
+        header = next(records, None)
+        if header is None:
+            return
+    else:
+        records = (line for line in f if line.strip())
+    offset = 0
+    while True:
+        chunk = list(itertools.islice(records, chunk_rows))
+        if not chunk:
+            return
+        yield offset, header, chunk
+        offset += len(chunk)
+
+
+def _csv_value(value: str):
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def parse_row(header, record, feature_cols) -> dict:
+    if header is None:
+        row = _unwrap_payload(json.loads(record))
+        if not isinstance(row, dict):
+            raise ValueError(f"expected a JSON object, got {type(row).__name__}")
+    else:
+        # empty cells are left out, so they fall back to the API default like a missing JSON key
+        row = {k: _csv_value(v) for k, v in zip(header, record) if v != ""}
+    for col in feature_cols:
+        if col in row:
+            try:
+                float(row[col])
+            except (TypeError, ValueError):
+                raise ValueError(f"{col}={row[col]!r} is not a number")
+    return row
+
+
+def parse_rows(header, records, feature_cols, offset: int) -> tuple:
+    # -> (rows, their row numbers, [(row number, error)]); unparseable rows are left out
+    rows, numbers, rejects = [], [], []
+    for i, record in enumerate(records):
+        try:
+            rows.append(parse_row(header, record, feature_cols))
+            numbers.append(offset + i)
+        except ValueError as exc:  # json.JSONDecodeError is a ValueError
+            rejects.append((offset + i, str(exc)))
+    return rows, numbers, rejects
+
+
+def output_header(stage: str, id_column, keep_inputs: bool, recommendations: bool) -> list:
+    spec = STAGES[stage]
+    cols = ["row"] + ([id_column] if id_column else []) + (list(spec["feature_cols"]) if keep_inputs else [])
+    return cols + list(spec["target_cols"]) + (["recommendations"] if recommendations else [])
+
+
+def init_worker(stage: str, out_fmt: str, id_column, keep_inputs: bool, recommendations: bool,
+                skip_errors: bool) -> None:
+    model, _ = _load_stage_model(stage)
+    _WORKER.update(stage=stage, model=model, out_fmt=out_fmt, id_column=id_column, keep_inputs=keep_inputs,
+                   recommendations=recommendations, skip_errors=skip_errors)
+
+
+def score_chunk(task) -> tuple:
+    # parse, one predict for the whole chunk, serialize -> (rows, rejects, text)
+    offset, header, records = task
+    w = _WORKER
+    spec = STAGES[w["stage"]]
+    rows, numbers, rejects = parse_rows(header, records, spec["feature_cols"], offset)
+    if rejects and not w["skip_errors"]:
+        raise RowError("row %d: %s" % rejects[0])
+    if not rows:
+        return 0, rejects, ""
+    x = _build_feature_matrix(rows, spec["feature_cols"])
+    y = w["model"].predict(x)
+    recs = generate_recommendations_batch(w["stage"], rows, _columns(y, spec["target_cols"])) if w["recommendations"] else None
+
+    buf = io.StringIO()
+    if w["out_fmt"] == "csv":
+        writer = csv.writer(buf)
+        for i, (row, y_row) in enumerate(zip(rows, y)):
+            line = [numbers[i]] + ([row.get(w["id_column"], "")] if w["id_column"] else [])
+            if w["keep_inputs"]:
+                line += list(x[i])
+            line += [float(v) for v in y_row]
+            if recs is not None:
+                line.append(json.dumps(recs[i]))
+            writer.writerow(line)
+    else:
+        for i, (row, y_row) in enumerate(zip(rows, y)):
+            out = {"row": numbers[i]}
+            if w["id_column"]:
+                out[w["id_column"]] = row.get(w["id_column"])
+            if w["keep_inputs"]:
+                out["inputs"] = row
+            out["outputs"] = dict(zip(spec["target_cols"], map(float, y_row)))
+            if recs is not None:
+                out["recommendations"] = recs[i]
+            buf.write(json.dumps(out))
+            buf.write("\n")
+    return len(rows), rejects, buf.getvalue()
+
+
+def run(tasks, out, args, init_args) -> tuple:
+    # ordered, bounded: at most 2 chunks per worker are queued or running at any time -> (rows, rejected)
+    total = rejected = 0
+    start = last_report = time.perf_counter()
+
+    def write(result):
+        nonlocal total, rejected, last_report
+        n, rejects, text = result
+        for number, error in rejects:
+            print(f"skipped row {number}: {error}", file=sys.stderr)
+        out.write(text)
+        total += n
+        rejected += len(rejects)
+        now = time.perf_counter()
+        if args.progress and now - last_report >= args.progress:
+            print(f"{total} rows  {total / (now - start):,.0f} rows/s", file=sys.stderr)
+            last_report = now
+
+    if args.workers <= 1:
+        init_worker(*init_args)
+        for task in tasks:
+            write(score_chunk(task))
+        return total, rejected
+
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker, initargs=init_args) as pool:
+        pending = []
+        for task in tasks:
+            pending.append(pool.submit(score_chunk, task))
+            if len(pending) >= 2 * args.workers:
+                write(pending.pop(0).result())
+        for future in pending:
+            write(future.result())
+    return total, rejected
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stage", required=True, choices=list(STAGE_NAMES))
+    parser.add_argument("--input", required=True, help="JSONL or CSV file (.gz/.bz2/.xz ok), - for stdin")
+    parser.add_argument("--output", required=True, help="JSONL or CSV file (.gz/.bz2/.xz ok), - for stdout")
+    parser.add_argument("--input-format", choices=["jsonl", "csv"], default=None, help="default: from the extension")
+    parser.add_argument("--output-format", choices=["jsonl", "csv"], default=None, help="default: from the extension")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="scoring processes (1 = in-process)")
+    parser.add_argument("--id-column", default=None, help="input field copied to every output row")
+    parser.add_argument("--keep-inputs", action="store_true", help="also write the input row / feature values")
+    parser.add_argument("--recommendations", action="store_true", help="add the rule-based recommendations")
+    parser.add_argument("--progress", type=float, default=10.0, help="seconds between progress lines (0 = off)")
+    parser.add_argument("--skip-errors", action="store_true", help="leave malformed rows out instead of stopping")
+    args = parser.parse_args()
+    if args.chunk_rows <= 0:
+        parser.error("--chunk-rows must be positive")
+
+    in_fmt = file_format(args.input, args.input_format)
+    out_fmt = file_format(args.output, args.output_format)
+    init_args = (args.stage, out_fmt, args.id_column, args.keep_inputs, args.recommendations, args.skip_errors)
+    start = time.perf_counter()
+    with open_text(args.input, "r") as f_in, open_text(args.output, "w") as f_out:
+        if out_fmt == "csv":
+            csv.writer(f_out).writerow(output_header(args.stage, args.id_column, args.keep_inputs, args.recommendations))
+        try:
+            total, rejected = run(read_chunks(f_in, in_fmt, args.chunk_rows), f_out, args, init_args)
+        except RowError as exc:
+            # the output holds every row before the failing chunk; rerun with --skip-errors or fix the input
+            sys.exit(f"{args.stage}: stopped at {exc} (output is incomplete; --skip-errors leaves bad rows out)")
+    elapsed = time.perf_counter() - start
+    rate = total / elapsed if elapsed > 0 else 0.0
+    print(f"{args.stage}: {total} rows in {elapsed:.1f} s ({rate:,.0f} rows/s, {args.workers} workers)"
+          + (f", {rejected} rows skipped" if rejected else ""), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,24 @@
 # service.py
+import os
+import json
+import time
+import asyncio
+import logging
+import shutil
+import tempfile
+import threading
+import warnings
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import joblib
 import bentoml
+from prometheus_client import Counter, Histogram
+from bentoml.exceptions import InvalidArgument, ServiceUnavailable
 import random
-from typing import Dict, List
+from typing import AsyncGenerator, Dict, List
+
+logger = logging.getLogger("bentoml")
 
 # ---------------------------------------------------------
 # Model paths (relative to this file)
@@ -12,6 +27,92 @@ PRIMARY_MODEL_PATH = "models/primary_full_model.pkl"
 BIO_MODEL_PATH = "models/biological_full_model.pkl"
 TERTIARY_MODEL_PATH = "models/tertiary_full_model.pkl"
 
+# ---------------------------------------------------------
+# Adaptive batching (BentoML merges concurrent *_batchable calls)
+# ---------------------------------------------------------
+BATCH_MAX_SIZE = int(os.environ.get("AQUASMART_BATCH_MAX_SIZE", "256"))
+BATCH_MAX_LATENCY_MS = int(os.environ.get("AQUASMART_BATCH_MAX_LATENCY_MS", "50"))
+
+# ---------------------------------------------------------
+# Prediction cache (feature vector -> model outputs, LRU), direct/batch/pipeline endpoints only
+# ---------------------------------------------------------
+PREDICTION_CACHE_SIZE = int(os.environ.get("AQUASMART_CACHE_SIZE", "0"))  # off by default; > 0 enables it
+# exact keys unless enabled: quantized keys return a neighbouring row's prediction
+CACHE_QUANTIZE = os.environ.get("AQUASMART_CACHE_QUANTIZE", "0").lower() in ("1", "true", "yes")
+CACHE_DEFAULT_RESOLUTION = 1e-3
+
+# sensor-level resolution for large-magnitude columns; everything else uses the default
+CACHE_FEATURE_RESOLUTION = {
+    "Q_in_mld": 0.01, "Q_bio_mld": 0.01, "Q_ter_mld": 0.01,
+    "TSS_in_mgL": 0.1, "BOD5_in_mgL": 0.1, "COD_in_mgL": 0.1,
+    "TSS_in_bio_mgL": 0.1, "BOD5_in_bio_mgL": 0.1, "COD_in_bio_mgL": 0.1,
+    "MLSS_mgL": 1.0, "Ecoli_in_CFU_100mL": 1.0, "lamp_power_W": 1.0,
+    "tank_surface_area_m2": 0.1, "membrane_area_m2": 0.1, "biofilter_surface_area_m2": 0.1,
+    "weir_loading_m3mh": 0.01, "sludge_withdrawal_rate_m3h": 0.01, "H2O2_mgL": 0.01,
+}
+
+# ---------------------------------------------------------
+# Inference backend per stage: "sklearn" (model.predict) or "compiled" (flat-array trees)
+# ---------------------------------------------------------
+STAGE_NAMES = ("primary", "biological", "tertiary")
+
+INFERENCE_BACKENDS = {
+    stage: os.environ.get(f"AQUASMART_{stage.upper()}_BACKEND", os.environ.get("AQUASMART_INFERENCE_BACKEND", "sklearn"))
+    for stage in STAGE_NAMES
+}
+
+# batches this large go back to sklearn, whose per-row cost is lower once per-call overhead is amortized
+COMPILED_FALLBACK_ROWS = int(os.environ.get("AQUASMART_COMPILED_FALLBACK_ROWS", "256"))
+# rows x trees walked per vectorized pass; bounds the node-index temporaries (~8 bytes per cell each)
+COMPILED_CHUNK_CELLS = int(os.environ.get("AQUASMART_COMPILED_CHUNK_CELLS", "262144"))
+
+# ---------------------------------------------------------
+# Model loading (cold start)
+# ---------------------------------------------------------
+MODEL_PATHS = {"primary": PRIMARY_MODEL_PATH, "biological": BIO_MODEL_PATH, "tertiary": TERTIARY_MODEL_PATH}
+MODEL_LOAD_WORKERS = int(os.environ.get("AQUASMART_MODEL_LOAD_WORKERS", str(len(STAGE_NAMES))))
+# one synthetic prediction per stage before the service reports ready
+MODEL_WARMUP = os.environ.get("AQUASMART_MODEL_WARMUP", "1").lower() not in ("0", "false", "no")
+
+# compiled tree arrays exported once per host and memory-mapped read-only by every worker
+SHARED_MODELS = os.environ.get("AQUASMART_SHARED_MODELS", "0").lower() in ("1", "true", "yes")
+SHARED_MODEL_DIR = os.environ.get(
+    "AQUASMART_SHARED_MODEL_DIR",
+    "/dev/shm/aquasmart" if os.path.isdir("/dev/shm") else os.path.join(tempfile.gettempdir(), "aquasmart"),
+)
+SHARED_ARRAYS = ("feature", "threshold", "children", "value", "roots", "target_starts")
+SHARED_FORMAT = 3  # bumped when the export layout or offsets change, so stale exports are not attached
+
+# ---------------------------------------------------------
+# Async offload pools (*_async endpoints): running + queued calls beyond the limit get a 503
+# ---------------------------------------------------------
+PREDICT_CONCURRENCY = int(os.environ.get("AQUASMART_PREDICT_CONCURRENCY", "4"))
+PREDICT_QUEUE = int(os.environ.get("AQUASMART_PREDICT_QUEUE", "64"))
+OPTIMIZE_CONCURRENCY = int(os.environ.get("AQUASMART_OPTIMIZE_CONCURRENCY", "1"))
+OPTIMIZE_QUEUE = int(os.environ.get("AQUASMART_OPTIMIZE_QUEUE", "4"))
+
+# ---------------------------------------------------------
+# Hot-path metrics (prometheus_client default registry, served on BentoML's /metrics)
+# ---------------------------------------------------------
+METRICS_ENABLED = os.environ.get("AQUASMART_METRICS", "1").lower() not in ("0", "false", "no")
+# sample / screen / build / predict / score / select / recommend
+PHASE_SECONDS = Histogram(
+    "aquasmart_phase_seconds", "Time spent per hot-path phase", ["stage", "phase"],
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+CANDIDATES_EVALUATED = Counter("aquasmart_candidates_evaluated", "Optimizer candidates scored", ["stage"])
+CANDIDATES_FEASIBLE = Counter("aquasmart_candidates_feasible", "Optimizer candidates passing the feasibility check", ["stage"])
+SEARCH_OUTCOMES = Counter("aquasmart_progressive_search", "Progressive searches settled by the narrow phase or widened", ["stage", "phase"])
+CACHE_LOOKUPS = Counter("aquasmart_cache_lookups", "Prediction cache lookups per row", ["stage", "result"])
+
+def _observe_phase(stage: str, phase: str, start: float) -> None:
+    if METRICS_ENABLED:
+        PHASE_SECONDS.labels(stage, phase).observe(time.perf_counter() - start)
+
+def _count(counter, amount, *labels) -> None:
+    if METRICS_ENABLED and amount:
+        counter.labels(*labels).inc(amount)
+
 # ---------------------------------------------------------
 # Feature & target columns
 # ---------------------------------------------------------
@@ -89,6 +190,24 @@ def _unwrap_payload(request_json: dict) -> dict:
 def _build_feature_array(payload: dict, feature_cols):
     return np.array([[payload.get(col, 0.0) for col in feature_cols]], dtype=float)
 
+def _build_feature_matrix(payloads: List[dict], feature_cols):
+    x = np.array([[p.get(col, 0.0) for col in feature_cols] for p in payloads], dtype=float)
+    return x.reshape(len(payloads), len(feature_cols))
+
+def _batch_items(payload: dict) -> List[dict]:
+    items = payload.get("items", [])
+    return [_unwrap_payload(item) for item in items]
+
+def _throughput(num_items: int, elapsed_s: float) -> float:
+    return float(num_items / elapsed_s) if elapsed_s > 0 else 0.0
+
+def _is_int_bound(low, high) -> bool:
+    return isinstance(low, int) and isinstance(high, int)
+
+def _sample_bounds(base_inputs: dict, bounds: dict, fixed_keys) -> dict:
+    # fixed keys present in the base config are never perturbed
+    return {k: v for k, v in bounds.items() if not (k in fixed_keys and k in base_inputs)}
+
 def sample_config_around(current: dict, bounds: dict, scale: float = 0.3):
     candidate = current.copy()
     for key, (low, high) in bounds.items():
@@ -110,180 +229,379 @@ def sample_config_around(current: dict, bounds: dict, scale: float = 0.3):
                 candidate[key] = random.uniform(local_low, local_high)
     return candidate
 
+def _local_box(current: dict, bounds: dict, scale: float):
+    # per-key sampling range: the clipped window around the current value, or the full bounds
+    low, high = [], []
+    for key, (b_low, b_high) in bounds.items():
+        cur = current.get(key, None)
+        if cur is None:
+            low.append(b_low)
+            high.append(b_high)
+        else:
+            span = b_high - b_low
+            low.append(max(b_low, cur - scale * span))
+            high.append(min(b_high, cur + scale * span))
+    return np.array(low, dtype=float), np.array(high, dtype=float)
+
+def _qmc_unit(sampler: str, n: int, d: int, rng) -> np.ndarray:
+    from scipy.stats import qmc
+    if sampler == "sobol":
+        engine = qmc.Sobol(d, scramble=True, seed=rng)
+        with warnings.catch_warnings():
+            # balance is only exact for powers of two; shards are OPT_SHARD_SIZE except the last
+            warnings.simplefilter("ignore", UserWarning)
+            return engine.random(n)
+    if sampler == "lhs":
+        return qmc.LatinHypercube(d, seed=rng).random(n)
+    raise InvalidArgument(f"unknown sampler '{sampler}', expected one of {OPT_SAMPLERS}")
+
+def qmc_configs_around(current: dict, bounds: dict, n: int, scale: float = 0.3, rng=None, sampler: str = "sobol"):
+    """
+    Low-discrepancy version of sample_configs_around: one scrambled Sobol or Latin hypercube
+    matrix over the whole local box. Integer keys take the integers inside their local range
+    with equal probability (floor of the stratified coordinate, not rounding, so the end
+    values are not under-sampled). Returns (keys, samples).
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    keys = list(bounds.keys())
+    low, high = _local_box(current, bounds, scale)
+    u = _qmc_unit(sampler, n, len(keys), rng) if n else np.empty((0, len(keys)))
+    samples = low + (high - low) * u
+    for j, key in enumerate(keys):
+        if _is_int_bound(*bounds[key]):
+            i_low, i_high = np.ceil(low[j]), np.floor(high[j])
+            if i_low > i_high:
+                # window narrower than one step: nearest integer to its middle
+                samples[:, j] = np.rint((low[j] + high[j]) / 2.0)
+            else:
+                samples[:, j] = np.minimum(i_low + np.floor(u[:, j] * (i_high - i_low + 1)), i_high)
+    return keys, samples
+
+def sample_configs_around(current: dict, bounds: dict, n: int, scale: float = 0.3, rng=None, sampler: str = "random"):
+    """
+    Vectorized sample_config_around: draws n candidates at once.
+    Returns (keys, samples) where samples[i, j] is the value of keys[j] for candidate i.
+    sampler "sobol" / "lhs" switches to qmc_configs_around.
+    """
+    if sampler != "random":
+        return qmc_configs_around(current, bounds, n, scale=scale, rng=rng, sampler=sampler)
+    rng = rng if rng is not None else np.random.default_rng()
+    keys = list(bounds.keys())
+    samples = np.empty((n, len(keys)), dtype=float)
+    for j, key in enumerate(keys):
+        low, high = bounds[key]
+        is_int = _is_int_bound(low, high)
+        cur = current.get(key, None)
+        if cur is None:
+            # if cur not provided, sample globally within bounds
+            if is_int:
+                samples[:, j] = rng.integers(low, high + 1, size=n)
+            else:
+                samples[:, j] = rng.uniform(low, high, size=n)
+        else:
+            rng_span = high - low
+            local_low = max(low, cur - scale * rng_span)
+            local_high = min(high, cur + scale * rng_span)
+            # same form as random.uniform, so a cur outside bounds still works
+            col = local_low + (local_high - local_low) * rng.random(n)
+            # integer params are rounded inside the local range
+            samples[:, j] = np.rint(col) if is_int else col
+    return keys, samples
+
+def _shard_plan(n: int, seed_seq: np.random.SeedSequence):
+    # [(child seed, shard size)] - depends only on n and the seed, never on the worker count
+    n_shards = -(-n // OPT_SHARD_SIZE) if n > 0 else 0
+    sizes = [min(OPT_SHARD_SIZE, n - i * OPT_SHARD_SIZE) for i in range(n_shards)]
+    return list(zip(seed_seq.spawn(n_shards), sizes))
+
+def _build_candidate_matrix(base_inputs: dict, feature_cols, keys, samples):
+    # every row starts as the base config, then sampled columns are overwritten
+    x = np.repeat(_build_feature_array(base_inputs, feature_cols), samples.shape[0], axis=0)
+    col_index = {col: i for i, col in enumerate(feature_cols)}
+    for j, key in enumerate(keys):
+        if key in col_index:
+            x[:, col_index[key]] = samples[:, j]
+    return x
+
+def _candidate_inputs(base_inputs: dict, keys, row, bounds: dict) -> dict:
+    cand = base_inputs.copy()
+    for key, value in zip(keys, row):
+        low, high = bounds[key]
+        cand[key] = int(value) if _is_int_bound(low, high) else float(value)
+    return cand
+
 # ---------------------------------------------------------
 # RULE-BASED RECOMMENDATIONS (unchanged logic, kept for UI)
 # ---------------------------------------------------------
-def recommend_screening(inp: dict, outp: dict):
-    recs = []
-    eff = outp.get("screen_TSS_removal_eff_pct", 0.0)
-    bar_spacing = inp.get("bar_spacing_mm", None)
-    velocity = inp.get("approach_velocity_ms", None)
-    open_area = inp.get("open_area_fraction", None)
-    Q = inp.get("Q_in_mld", 0.0)
-    e_kwh_day = outp.get("screen_energy_kwh_day", 0.0)
-    epm3 = energy_per_m3(e_kwh_day, Q)
-
-    if eff < 25:
-        if bar_spacing and bar_spacing > 15: recs.append(f"Screening efficiency is low ({eff:.1f}%). Reduce bar spacing from {bar_spacing:.1f} mm towards 10–15 mm.")
-        if velocity and (velocity < 0.7 or velocity > 1.0): recs.append(f"Approach velocity is {velocity:.2f} m/s. Adjust to 0.7–0.9 m/s.")
-        if open_area and open_area < 0.5: recs.append(f"Open area fraction is {open_area:.2f}. Consider screens with ≥0.5 open area.")
-    if epm3 and epm3 > 0.015: recs.append(f"Screening specific energy is about {epm3*1000:.1f} Wh/m³. Optimize screen runtime.")
-    if not recs: recs.append(f"Screening is operating efficiently ({eff:.1f}% TSS removal). Maintain current settings.")
+# Rules are data: each row is (stage, unit, conditions, message template) and is evaluated
+# over a whole batch of inputs/outputs as NumPy masks; messages are only formatted for rows
+# where the rule fires. Units with no firing rule get their fallback message.
+#
+# Fields per unit: name -> ("in", input key, default) | ("out", output key, default)
+#                        | ("energy_per_m3", output energy key, input flow key, scale)
+# A default of None means "missing" (NaN), so comparisons on it never fire.
+# Conditions (ANDed): (field, op, threshold) with op in <, >, ==, nonzero; or ("any", [conditions]).
+RECOMMENDATION_FIELDS = {
+    ("primary", "screening"): {
+        "eff": ("out", "screen_TSS_removal_eff_pct", 0.0),
+        "bar_spacing": ("in", "bar_spacing_mm", None),
+        "velocity": ("in", "approach_velocity_ms", None),
+        "open_area": ("in", "open_area_fraction", None),
+        "epm3": ("energy_per_m3", "screen_energy_kwh_day", "Q_in_mld", 1.0),
+        "epm3_wh": ("energy_per_m3", "screen_energy_kwh_day", "Q_in_mld", 1000.0),
+    },
+    ("primary", "grit"): {
+        "eff": ("out", "grit_removal_eff_pct", 0.0),
+        "v": ("in", "inlet_velocity_ms", 0.0),
+        "dt": ("in", "detention_time_s", 0.0),
+        "grit_type": ("in", "grit_type", 0),
+        "e": ("out", "grit_energy_kwh_day", 0.0),
+    },
+    ("primary", "sedimentation"): {
+        "tss_eff": ("out", "sed_TSS_removal_eff_pct", 0.0),
+        "HRT": ("in", "HRT_h", 0.0),
+        "SLR": ("in", "surface_loading_rate_m3m2h", 0.0),
+        "weir_load": ("in", "weir_loading_m3mh", 0.0),
+    },
+    ("primary", "daf"): {
+        "tss_eff": ("out", "daf_TSS_removal_eff_pct", 0.0),
+        "og_eff": ("out", "daf_OG_removal_eff_pct", 0.0),
+        "recycle": ("in", "recycle_ratio_pct", 0.0),
+        "coagulant": ("in", "coagulant_dose_mgL", 0.0),
+        "bubbles": ("in", "bubble_diameter_um", 0.0),
+        "epm3": ("energy_per_m3", "daf_energy_kwh_day", "Q_in_mld", 1.0),
+        "epm3_wh": ("energy_per_m3", "daf_energy_kwh_day", "Q_in_mld", 1000.0),
+    },
+    ("biological", "asp"): {
+        "bod_eff": ("out", "BOD_eff_AS_pct", 0.0),
+        "nh4_eff": ("out", "NH4_eff_AS_pct", 0.0),
+        "DO": ("in", "DO_mgL", None),
+        "FM": ("in", "F_M_ratio_kgkgd", None),
+    },
+    ("biological", "biofilter"): {
+        "nh4_eff": ("out", "NH4_eff_bio_pct", 0.0),
+        "BOD_polish": ("out", "BOD_polish_eff_pct", 0.0),
+        "HRT": ("in", "HRT_bio_h", 0.0),
+        "air": ("in", "air_flow_m3m2min", 0.0),
+    },
+    ("biological", "overall"): {
+        "BOD_tot": ("out", "BOD_total_eff_pct", 0.0),
+        "NH4_tot": ("out", "NH4_total_eff_pct", 0.0),
+        "oxy": ("out", "oxygen_utilization_pct", 0.0),
+        "energy": ("out", "total_bio_energy_kwh_day", 0.0),
+    },
+    ("tertiary", "membrane"): {
+        "turb_out": ("out", "turbidity_after_membrane_NTU", 0.0),
+        "tss_out": ("out", "TSS_after_membrane_mgL", 0.0),
+        "pore": ("in", "membrane_pore_size_um", None),
+        "flux": ("in", "flux_LMH", None),
+    },
+    ("tertiary", "uv"): {
+        "LRV": ("out", "LRV_uv", 0.0),
+        "ecoli": ("out", "Ecoli_final_CFU_100mL", 0.0),
+        "dose": ("in", "UV_dose_mJcm2", None),
+        "UVT": ("in", "UVT_pct", None),
+    },
+    ("tertiary", "aop"): {
+        "micro_final": ("out", "micropollutant_final_ugL", 0.0),
+        "oz": ("in", "ozone_dose_mgL", 0.0),
+        "h2o2": ("in", "H2O2_mgL", 0.0),
+    },
+}
+
+_SCREEN_LOW = ("eff", "<", 25)
+_DAF_MODEST = ("any", [("tss_eff", "<", 70), ("og_eff", "<", 80)])
+_MEMBRANE_POOR = ("any", [("turb_out", ">", 1.0), ("tss_out", ">", 5)])
+_UV_LOW = ("any", [("LRV", "<", 3), ("ecoli", ">", 10)])
+
+RECOMMENDATION_RULES = [
+    # PRIMARY
+    ("primary", "screening", [_SCREEN_LOW, ("bar_spacing", ">", 15)],
+     "Screening efficiency is low ({eff:.1f}%). Reduce bar spacing from {bar_spacing:.1f} mm towards 10–15 mm."),
+    ("primary", "screening", [_SCREEN_LOW, ("velocity", "nonzero", None), ("any", [("velocity", "<", 0.7), ("velocity", ">", 1.0)])],
+     "Approach velocity is {velocity:.2f} m/s. Adjust to 0.7–0.9 m/s."),
+    ("primary", "screening", [_SCREEN_LOW, ("open_area", "nonzero", None), ("open_area", "<", 0.5)],
+     "Open area fraction is {open_area:.2f}. Consider screens with ≥0.5 open area."),
+    ("primary", "screening", [("epm3", ">", 0.015)],
+     "Screening specific energy is about {epm3_wh:.1f} Wh/m³. Optimize screen runtime."),
+    ("primary", "grit", [("eff", "<", 60)],
+     "Grit removal efficiency is {eff:.1f}%. Increase detention time towards 60–80 s."),
+    ("primary", "grit", [("eff", "<", 60), ("dt", "<", 50)],
+     "Current detention time is {dt:.0f} s. Increase tank volume."),
+    ("primary", "grit", [("eff", "<", 60), ("v", ">", 0.35)],
+     "Inlet velocity {v:.2f} m/s is high. Adjust to < 0.30 m/s."),
+    ("primary", "grit", [("grit_type", "==", 1), ("e", ">", 10)],
+     "Aerated grit energy {e:.1f} kWh/d. Optimize blower."),
+    ("primary", "sedimentation", [("tss_eff", "<", 50)],
+     "Primary clarifier TSS removal ({tss_eff:.1f}%) is low. Increase HRT or reduce SLR."),
+    ("primary", "sedimentation", [("HRT", "<", 1.5)], "HRT is {HRT:.2f} h. Increase volume."),
+    ("primary", "sedimentation", [("SLR", ">", 3.0)], "SLR is {SLR:.2f} m³/m²·h (high)."),
+    ("primary", "sedimentation", [("weir_load", ">", 20)], "Weir loading {weir_load:.1f} m³/m·h is high."),
+    ("primary", "daf", [_DAF_MODEST], "DAF removal modest. Increase coagulant/recycle."),
+    ("primary", "daf", [_DAF_MODEST, ("coagulant", "<", 30)], "Coagulant {coagulant:.1f} mg/L is low."),
+    ("primary", "daf", [_DAF_MODEST, ("recycle", "<", 10)], "Recycle {recycle:.1f}% is low."),
+    ("primary", "daf", [_DAF_MODEST, ("bubbles", ">", 100)], "Bubbles {bubbles:.0f} µm are large."),
+    ("primary", "daf", [("epm3", ">", 0.05)], "DAF specific energy high ({epm3_wh:.1f} Wh/m³)."),
+    # BIOLOGICAL
+    ("biological", "asp", [("bod_eff", "<", 85)], "ASP BOD removal {bod_eff:.1f}% low. Increase SRT or MLSS."),
+    ("biological", "asp", [("nh4_eff", "<", 40)], "Nitrification low ({nh4_eff:.1f}%). Keep DO > 2 mg/L and sufficient SRT."),
+    ("biological", "asp", [("DO", "<", 1.5)], "DO {DO:.2f} mg/L is low. Increase aeration."),
+    ("biological", "asp", [("FM", ">", 0.5)], "F/M {FM:.2f} is high; consider increasing MLSS or HRT."),
+    ("biological", "biofilter", [("nh4_eff", "<", 70)], "Biofilter NH4 removal {nh4_eff:.1f}% low. Check media loading and DO."),
+    ("biological", "biofilter", [("HRT", "<", 3)], "Biofilter HRT {HRT:.1f} h low. Increase volume or reduce flow."),
+    ("biological", "biofilter", [("air", "<", 1.0)], "Air flow {air:.2f} m³/m²·min low. Increase aeration."),
+    ("biological", "biofilter", [("BOD_polish", "<", 10)], "BOD polish {BOD_polish:.1f}% low. Check upstream ASP performance."),
+    # TWEAKED: Threshold from < 90 to < 88
+    ("biological", "overall", [("BOD_tot", "<", 88)],
+     "Overall BOD removal {BOD_tot:.1f}% could be improved. Check ASP and biofilter loadings."),
+    ("biological", "overall", [("NH4_tot", "<", 80)], "Total NH4 removal {NH4_tot:.1f}% low. Increase SRT/DO."),
+    ("biological", "overall", [("oxy", "<", 70)], "Oxygen utilization {oxy:.1f}% low. Aeration may be inefficient."),
+    ("biological", "overall", [("energy", ">", 200)], "Biological energy {energy:.1f} kWh/d high. Optimize blowers and recycle."),
+    # TERTIARY
+    ("tertiary", "membrane", [_MEMBRANE_POOR], "Membrane effluent quality is poor. Check pore size and flux."),
+    ("tertiary", "membrane", [_MEMBRANE_POOR, ("pore", ">", 0.2)], "Pore size {pore:.2f} µm is large for fine polishing."),
+    ("tertiary", "membrane", [_MEMBRANE_POOR, ("flux", ">", 80)], "Flux {flux:.1f} LMH high; consider reducing to limit fouling."),
+    ("tertiary", "uv", [_UV_LOW], "UV disinfection is low. Increase dose or check UVT and lamp condition."),
+    ("tertiary", "uv", [_UV_LOW, ("dose", "nonzero", None), ("dose", "<", 30)], "Dose {dose:.1f} mJ/cm² is low for high log removal."),
+    ("tertiary", "uv", [_UV_LOW, ("UVT", "nonzero", None), ("UVT", "<", 85)], "UVT {UVT:.1f}% low; improve upstream turbidity."),
+    ("tertiary", "aop", [("micro_final", ">", 0.1)], "Micropollutant residual {micro_final:.3f} µg/L high. Increase oxidant doses."),
+    ("tertiary", "aop", [("micro_final", ">", 0.1), ("oz", "<", 5)], "Ozone {oz:.1f} mg/L low."),
+    ("tertiary", "aop", [("micro_final", ">", 0.1), ("h2o2", "<", 50)], "H2O2 {h2o2:.1f} mg/L low."),
+]
+
+# message when none of a unit's rules fire (units are reported in this order)
+RECOMMENDATION_FALLBACKS = {
+    "primary": {
+        "screening": "Screening is operating efficiently ({eff:.1f}% TSS removal). Maintain current settings.",
+        "grit": "Grit removal is stable ({eff:.1f}%). Maintain current operation.",
+        "sedimentation": "Primary sedimentation is performing well ({tss_eff:.1f}% removal). Maintain current settings.",
+        "daf": "DAF is achieving high removals. Maintain current settings.",
+    },
+    "biological": {
+        "asp": "ASP is performing well. Maintain current operation.",
+        "biofilter": "Biofilter is providing good polishing. Maintain settings.",
+        "overall": "Biological system is performing well.",
+    },
+    "tertiary": {
+        "membrane": "Membrane achieving low turbidity/TSS. Maintain operation.",
+        "uv": "UV providing strong disinfection. Maintain settings.",
+        "aop": "AOP achieving good micropollutant removal. Maintain.",
+    },
+}
+
+def _as_float(value) -> float:
+    return np.nan if value is None else float(value)
+
+def _rule_field(spec: tuple, inputs: List[dict], outputs: dict, n: int) -> np.ndarray:
+    kind = spec[0]
+    if kind == "in":
+        _, key, default = spec
+        return np.array([_as_float(inp.get(key, default)) for inp in inputs], dtype=float)
+    if kind == "out":
+        _, key, default = spec
+        if key in outputs:
+            return np.asarray(outputs[key], dtype=float)
+        return np.full(n, _as_float(default))
+    # energy_per_m3: None (NaN) when there is no flow
+    _, energy_key, flow_key, scale = spec
+    energy = np.asarray(outputs[energy_key], dtype=float) if energy_key in outputs else np.zeros(n)
+    q_m3_day = np.array([_as_float(inp.get(flow_key, 0.0)) for inp in inputs], dtype=float) * 1000.0
+    epm3 = np.full(n, np.nan)
+    np.divide(energy, q_m3_day, out=epm3, where=q_m3_day > 0)
+    return epm3 * scale
+
+def _rule_mask(conditions: list, fields: dict, n: int) -> np.ndarray:
+    mask = np.ones(n, dtype=bool)
+    for cond in conditions:
+        if cond[0] == "any":
+            sub = np.zeros(n, dtype=bool)
+            for c in cond[1]:
+                sub |= _rule_mask([c], fields, n)
+            mask &= sub
+            continue
+        name, op, threshold = cond
+        v = fields[name]
+        if op == "<":
+            mask &= v < threshold
+        elif op == ">":
+            mask &= v > threshold
+        elif op == "==":
+            mask &= v == threshold
+        elif op == "nonzero":
+            mask &= (v != 0) & ~np.isnan(v)
+        else:
+            raise ValueError(f"unknown rule comparator '{op}'")
+    return mask
+
+def generate_recommendations_batch(stage: str, inputs: List[dict], outputs: dict) -> List[dict]:
+    """
+    Recommendations for n rows at once. inputs: list of n input dicts;
+    outputs: target name -> length-n array (e.g. columns of the model output matrix).
+    """
+    start = time.perf_counter()
+    n = len(inputs)
+    units = RECOMMENDATION_FALLBACKS[stage]
+    recs = [{unit: [] for unit in units} for _ in range(n)]
+    unit_fields = {unit: {name: _rule_field(spec, inputs, outputs, n) for name, spec in RECOMMENDATION_FIELDS[(stage, unit)].items()}
+                   for unit in units}
+
+    def fmt(template: str, unit: str, i: int) -> str:
+        return template.format(**{name: v[i] for name, v in unit_fields[unit].items()})
+
+    for rule_stage, unit, conditions, template in RECOMMENDATION_RULES:
+        if rule_stage != stage:
+            continue
+        for i in np.flatnonzero(_rule_mask(conditions, unit_fields[unit], n)):
+            recs[i][unit].append(fmt(template, unit, i))
+
+    for unit, template in units.items():
+        for i in range(n):
+            if not recs[i][unit]:
+                recs[i][unit].append(fmt(template, unit, i))
+    _observe_phase(stage, "recommend", start)
     return recs
 
+def _recommend_row(stage: str, inputs: dict, outputs: dict) -> dict:
+    return generate_recommendations_batch(stage, [inputs], {k: np.array([_as_float(v)]) for k, v in outputs.items()})[0]
+
+def recommend_screening(inp: dict, outp: dict):
+    return _recommend_row("primary", inp, outp)["screening"]
+
 def recommend_grit(inp: dict, outp: dict):
-    recs = []
-    eff = outp.get("grit_removal_eff_pct", 0.0)
-    v = inp.get("inlet_velocity_ms", 0.0)
-    dt = inp.get("detention_time_s", 0.0)
-    grit_type = "aerated" if inp.get("grit_type", 0) == 1 else "plain"
-    if eff < 60:
-        recs.append(f"Grit removal efficiency is {eff:.1f}%. Increase detention time towards 60–80 s.")
-        if dt < 50: recs.append(f"Current detention time is {dt:.0f} s. Increase tank volume.")
-        if v > 0.35: recs.append(f"Inlet velocity {v:.2f} m/s is high. Adjust to < 0.30 m/s.")
-    if grit_type == "aerated":
-        e = outp.get("grit_energy_kwh_day", 0.0)
-        if e > 10: recs.append(f"Aerated grit energy {e:.1f} kWh/d. Optimize blower.")
-    if not recs: recs.append(f"Grit removal is stable ({eff:.1f}%). Maintain current operation.")
-    return recs
+    return _recommend_row("primary", inp, outp)["grit"]
 
 def recommend_sedimentation(inp: dict, outp: dict):
-    recs = []
-    tss_eff = outp.get("sed_TSS_removal_eff_pct", 0.0)
-    HRT = inp.get("HRT_h", 0.0)
-    SLR = inp.get("surface_loading_rate_m3m2h", 0.0)
-    weir_load = inp.get("weir_loading_m3mh", 0.0)
-    if tss_eff < 50: recs.append(f"Primary clarifier TSS removal ({tss_eff:.1f}%) is low. Increase HRT or reduce SLR.")
-    if HRT < 1.5: recs.append(f"HRT is {HRT:.2f} h. Increase volume.")
-    if SLR > 3.0: recs.append(f"SLR is {SLR:.2f} m³/m²·h (high).")
-    if weir_load > 20: recs.append(f"Weir loading {weir_load:.1f} m³/m·h is high.")
-    if not recs: recs.append(f"Primary sedimentation is performing well ({tss_eff:.1f}% removal). Maintain current settings.")
-    return recs
+    return _recommend_row("primary", inp, outp)["sedimentation"]
 
 def recommend_daf(inp: dict, outp: dict):
-    recs = []
-    tss_eff = outp.get("daf_TSS_removal_eff_pct", 0.0)
-    og_eff = outp.get("daf_OG_removal_eff_pct", 0.0)
-    recycle = inp.get("recycle_ratio_pct", 0.0)
-    coagulant = inp.get("coagulant_dose_mgL", 0.0)
-    bubbles = inp.get("bubble_diameter_um", 0.0)
-    Q = inp.get("Q_in_mld", 0.0)
-    e = outp.get("daf_energy_kwh_day", 0.0)
-    epm3 = energy_per_m3(e, Q)
-    if tss_eff < 70 or og_eff < 80:
-        recs.append("DAF removal modest. Increase coagulant/recycle.")
-        if coagulant < 30: recs.append(f"Coagulant {coagulant:.1f} mg/L is low.")
-        if recycle < 10: recs.append(f"Recycle {recycle:.1f}% is low.")
-        if bubbles > 100: recs.append(f"Bubbles {bubbles:.0f} µm are large.")
-    if epm3 and epm3 > 0.05: recs.append(f"DAF specific energy high ({epm3*1000:.1f} Wh/m³).")
-    if not recs: recs.append("DAF is achieving high removals. Maintain current settings.")
-    return recs
+    return _recommend_row("primary", inp, outp)["daf"]
 
 def generate_recommendations_primary(inputs: dict, outputs: dict):
-    return {
-        "screening": recommend_screening(inputs, outputs),
-        "grit": recommend_grit(inputs, outputs),
-        "sedimentation": recommend_sedimentation(inputs, outputs),
-        "daf": recommend_daf(inputs, outputs),
-    }
+    return _recommend_row("primary", inputs, outputs)
 
 def recommend_asp(inp: dict, outp: dict):
-    recs = []
-    bod_eff = outp.get("BOD_eff_AS_pct", 0.0)
-    nh4_eff = outp.get("NH4_eff_AS_pct", 0.0)
-    MLSS = inp.get("MLSS_mgL", None)
-    DO = inp.get("DO_mgL", None)
-    FM = inp.get("F_M_ratio_kgkgd", None)
-    if bod_eff < 85: recs.append(f"ASP BOD removal {bod_eff:.1f}% low. Increase SRT or MLSS.")
-    if nh4_eff < 40: recs.append(f"Nitrification low ({nh4_eff:.1f}%). Keep DO > 2 mg/L and sufficient SRT.")
-    if DO is not None and DO < 1.5: recs.append(f"DO {DO:.2f} mg/L is low. Increase aeration.")
-    if FM is not None and FM > 0.5: recs.append(f"F/M {FM:.2f} is high; consider increasing MLSS or HRT.")
-    if not recs: recs.append("ASP is performing well. Maintain current operation.")
-    return recs
+    return _recommend_row("biological", inp, outp)["asp"]
 
 def recommend_biofilter(inp: dict, outp: dict):
-    recs = []
-    nh4_eff = outp.get("NH4_eff_bio_pct", 0.0)
-    BOD_polish = outp.get("BOD_polish_eff_pct", 0.0)
-    HRT = inp.get("HRT_bio_h", 0.0)
-    air = inp.get("air_flow_m3m2min", 0.0)
-    if nh4_eff < 70: recs.append(f"Biofilter NH4 removal {nh4_eff:.1f}% low. Check media loading and DO.")
-    if HRT < 3: recs.append(f"Biofilter HRT {HRT:.1f} h low. Increase volume or reduce flow.")
-    if air < 1.0: recs.append(f"Air flow {air:.2f} m³/m²·min low. Increase aeration.")
-    if BOD_polish < 10: recs.append(f"BOD polish {BOD_polish:.1f}% low. Check upstream ASP performance.")
-    if not recs: recs.append("Biofilter is providing good polishing. Maintain settings.")
-    return recs
+    return _recommend_row("biological", inp, outp)["biofilter"]
 
 def recommend_bio_overall(outp: dict):
-    recs = []
-    BOD_tot = outp.get("BOD_total_eff_pct", 0.0)
-    NH4_tot = outp.get("NH4_total_eff_pct", 0.0)
-    oxy = outp.get("oxygen_utilization_pct", 0.0)
-    energy = outp.get("total_bio_energy_kwh_day", 0.0)
-
-    # TWEAKED: Threshold from < 90 to < 88
-    if BOD_tot < 88:
-        recs.append(f"Overall BOD removal {BOD_tot:.1f}% could be improved. Check ASP and biofilter loadings.")
-    if NH4_tot < 80:
-        recs.append(f"Total NH4 removal {NH4_tot:.1f}% low. Increase SRT/DO.")
-    if oxy < 70:
-        recs.append(f"Oxygen utilization {oxy:.1f}% low. Aeration may be inefficient.")
-    if energy > 200:
-        recs.append(f"Biological energy {energy:.1f} kWh/d high. Optimize blowers and recycle.")
-    if not recs: recs.append("Biological system is performing well.")
-    return recs
+    return _recommend_row("biological", {}, outp)["overall"]
 
 def generate_recommendations_biological(inputs: dict, outputs: dict):
-    return {
-        "asp": recommend_asp(inputs, outputs),
-        "biofilter": recommend_biofilter(inputs, outputs),
-        "overall": recommend_bio_overall(outputs),
-    }
+    return _recommend_row("biological", inputs, outputs)
 
 def recommend_membrane(inp: dict, outp: dict):
-    recs = []
-    turb_out = outp.get("turbidity_after_membrane_NTU", 0.0)
-    tss_out = outp.get("TSS_after_membrane_mgL", 0.0)
-    pore = inp.get("membrane_pore_size_um", None)
-    flux = inp.get("flux_LMH", None)
-    if turb_out > 1.0 or tss_out > 5:
-        recs.append("Membrane effluent quality is poor. Check pore size and flux.")
-        if pore and pore > 0.2: recs.append(f"Pore size {pore:.2f} µm is large for fine polishing.")
-        if flux and flux > 80: recs.append(f"Flux {flux:.1f} LMH high; consider reducing to limit fouling.")
-    if not recs: recs.append("Membrane achieving low turbidity/TSS. Maintain operation.")
-    return recs
+    return _recommend_row("tertiary", inp, outp)["membrane"]
 
 def recommend_uv(inp: dict, outp: dict):
-    recs = []
-    LRV = outp.get("LRV_uv", 0.0)
-    ecoli = outp.get("Ecoli_final_CFU_100mL", 0.0)
-    dose = inp.get("UV_dose_mJcm2", None)
-    UVT = inp.get("UVT_pct", None)
-    if LRV < 3 or ecoli > 10:
-        recs.append("UV disinfection is low. Increase dose or check UVT and lamp condition.")
-        if dose and dose < 30: recs.append(f"Dose {dose:.1f} mJ/cm² is low for high log removal.")
-        if UVT and UVT < 85: recs.append(f"UVT {UVT:.1f}% low; improve upstream turbidity.")
-    if not recs: recs.append("UV providing strong disinfection. Maintain settings.")
-    return recs
+    return _recommend_row("tertiary", inp, outp)["uv"]
 
 def recommend_aop(inp: dict, outp: dict):
-    recs = []
-    micro_final = outp.get("micropollutant_final_ugL", 0.0)
-    oz = inp.get("ozone_dose_mgL", 0.0)
-    h2o2 = inp.get("H2O2_mgL", 0.0)
-    if micro_final > 0.1:
-        recs.append(f"Micropollutant residual {micro_final:.3f} µg/L high. Increase oxidant doses.")
-        if oz < 5: recs.append(f"Ozone {oz:.1f} mg/L low.")
-        if h2o2 < 50: recs.append(f"H2O2 {h2o2:.1f} mg/L low.")
-    if not recs: recs.append("AOP achieving good micropollutant removal. Maintain.")
-    return recs
+    return _recommend_row("tertiary", inp, outp)["aop"]
 
 def generate_recommendations_tertiary(inputs: dict, outputs: dict):
-    return {
-        "membrane": recommend_membrane(inputs, outputs),
-        "uv": recommend_uv(inputs, outputs),
-        "aop": recommend_aop(inputs, outputs),
-    }
+    return _recommend_row("tertiary", inputs, outputs)
 
 # ---------------------------------------------------------
 # OPTIMIZATION CONFIGS (only plant parameters in bounds)
@@ -345,6 +663,79 @@ TER_OPT_BOUNDS = {
     "contact_time_AOP_min": (10.0, 30.0),
 }
 
+# influent/contaminant & fixed items (never varied by the optimizers)
+PRIMARY_FIXED_KEYS = [
+    "Q_in_mld", "temp_C", "pH",
+    "TSS_in_mgL", "BOD5_in_mgL", "COD_in_mgL",
+    "oil_grease_in_mgL", "peak_factor",
+    "screen_type", "grit_type", "clarifier_type",
+    "screen_angle_deg", "side_water_depth_m",
+    "weir_length_m", "saturator_retention_time_min",
+]
+
+BIO_FIXED_KEYS = [
+    "Q_bio_mld", "temp_C", "pH",
+    "TSS_in_bio_mgL", "BOD5_in_bio_mgL", "COD_in_bio_mgL",
+    "NH4_in_mgL", "NO3_in_mgL", "F_M_ratio_kgkgd",
+]
+
+TER_FIXED_KEYS = [
+    "Q_ter_mld", "temp_C", "pH_bulk",
+    "TSS_after_bio_mgL", "turbidity_in_NTU",
+    "BOD_in_ter_mgL", "COD_in_ter_mgL",
+    "NH4_in_ter_mgL", "NO3_in_ter_mgL", "TP_in_ter_mgL",
+    "Ecoli_in_CFU_100mL", "micropollutant_in_ugL",
+    "flux_LMH",
+]
+
+# parallel candidate evaluation: fixed-size shards, each with its own child seed,
+# so a request + seed gives the same candidates for any worker count
+OPT_SHARD_SIZE = 128
+OPT_WORKERS = int(os.environ.get("AQUASMART_OPT_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# iterative optimizer (algorithm="cem"): cross-entropy method in normalized bounds space
+OPT_ALGORITHMS = ("random", "cem")
+CEM_POPULATION = 64
+CEM_ELITE_FRAC = 0.2
+CEM_SMOOTHING = 0.7
+CEM_INIT_SIGMA = 0.25
+CEM_MIN_SIGMA = 0.02
+CEM_TOL = 0.01     # score points
+CEM_PATIENCE = 4
+
+# candidate generation for the random (progressive) search
+OPT_SAMPLERS = ("random", "sobol", "lhs")
+
+# multi-fidelity screening: every candidate is scored with the first SCREEN_FIDELITY of the
+# boosting stages, and only the best SCREEN_KEEP of each shard gets the full model
+SCREEN_FIDELITY = float(os.environ.get("AQUASMART_SCREEN_FIDELITY", "0.2"))
+SCREEN_KEEP = float(os.environ.get("AQUASMART_SCREEN_KEEP", "0.25"))
+
+# warm start: nearest past feasible optima for similar influent, per (stage, mode)
+WARMSTART_SIZE = int(os.environ.get("AQUASMART_WARMSTART_SIZE", "2000"))  # entries per (stage, mode); 0 disables
+WARMSTART_DEFAULT = os.environ.get("AQUASMART_WARMSTART", "0").lower() in ("1", "true", "yes")
+WARMSTART_PATH = os.environ.get("AQUASMART_WARMSTART_PATH") or None
+WARMSTART_SAVE_INTERVAL_S = 30.0
+WARMSTART_NEIGHBORS = 3
+WARMSTART_PER_SEED = 16   # candidates evaluated around each neighbour, the neighbour itself included
+WARMSTART_SCALE = 0.1
+WARMSTART_RADIUS = 1.0    # RMS distance in per-column spread units
+
+# what-if sweeps: points per axis when only low/high are given, and a cap on the whole grid
+SWEEP_DEFAULT_POINTS = 21
+SWEEP_MAX_POINTS = int(os.environ.get("AQUASMART_SWEEP_MAX_POINTS", "10000"))
+
+# robust mode: every candidate is scored under every influent scenario (drawn from the
+# request's distributions, or listed explicitly)
+ROBUST_SCENARIOS = int(os.environ.get("AQUASMART_ROBUST_SCENARIOS", "32"))
+ROBUST_MAX_SCENARIOS = int(os.environ.get("AQUASMART_ROBUST_MAX_SCENARIOS", "1000"))
+ROBUST_DISTRIBUTIONS = ("normal", "uniform", "triangular")
+
+# time-series simulation: timesteps per predict call, horizon cap, default reported percentiles
+SIM_CHUNK_ROWS = int(os.environ.get("AQUASMART_SIM_CHUNK_ROWS", "4096"))
+SIM_MAX_STEPS = int(os.environ.get("AQUASMART_SIM_MAX_STEPS", str(24 * 366 * 10)))
+SIM_PERCENTILES = (5, 50, 95)
+
 # ---------------------------------------------------------
 # Normalization helpers & expected ranges to stabilize scores
 # ---------------------------------------------------------
@@ -360,19 +751,22 @@ EFFICIENCY_EXPECTED_RANGES = {
     "tertiary": {"min": 0.0, "max": 100.0},
 }
 
+# the scoring helpers below also accept NumPy columns (dict of target -> array),
+# which is how the optimizers score a whole candidate batch at once
 def _normalize(value: float, min_v: float, max_v: float) -> float:
     try:
         if max_v <= min_v:
             return 0.0
-        v = (value - min_v) / (max_v - min_v)
-        return max(0.0, min(1.0, v))
+        v = np.clip((value - min_v) / (max_v - min_v), 0.0, 1.0)
+        return float(v) if np.ndim(v) == 0 else v
     except Exception:
         return 0.0
 
 def _score_to_0_100(val: float) -> float:
     # val expected in 0..1 (or close) -> 0..100
     try:
-        return float(max(0.0, min(100.0, val * 100.0)))
+        v = np.clip(val * 100.0, 0.0, 100.0)
+        return float(v) if np.ndim(v) == 0 else v
     except Exception:
         return 0.0
 
@@ -411,9 +805,9 @@ def primary_objective(outputs: dict, mode: str = "balanced") -> float:
 
 def primary_feasible(outputs: dict) -> bool:
     return (
-        outputs.get("BOD5_final_mgL", np.inf) <= 60.0
-        and outputs.get("COD_final_mgL", np.inf) <= 150.0
-        and outputs.get("TSS_final_mgL", np.inf) <= 30.0
+        (outputs.get("BOD5_final_mgL", np.inf) <= 60.0)
+        & (outputs.get("COD_final_mgL", np.inf) <= 150.0)
+        & (outputs.get("TSS_final_mgL", np.inf) <= 30.0)
     )
 
 # BIOLOGICAL
@@ -443,9 +837,9 @@ def bio_objective(outputs: dict, mode: str = "balanced") -> float:
 def bio_feasible(outputs: dict) -> bool:
     # Relaxed constraints but realistic—tweak if you want stricter
     return (
-        outputs.get("BOD_final_bio_mgL", np.inf) <= 50.0
-        and outputs.get("COD_final_bio_mgL", np.inf) <= 150.0
-        and outputs.get("NH4_final_mgL", np.inf) <= 5.0
+        (outputs.get("BOD_final_bio_mgL", np.inf) <= 50.0)
+        & (outputs.get("COD_final_bio_mgL", np.inf) <= 150.0)
+        & (outputs.get("NH4_final_mgL", np.inf) <= 5.0)
     )
 
 # TERTIARY
@@ -454,7 +848,7 @@ def ter_efficiency_metric(outputs: dict) -> float:
     micro_rem = outputs.get("micropollutant_removal_AOP_pct", 0.0)
     turb_final = outputs.get("turbidity_final_NTU", 0.0)
     # convert turbidity to score where lower turbidity improves score
-    turb_score = max(0.0, 100.0 - turb_final * 10.0)  # rough transform; tweakable
+    turb_score = np.maximum(0.0, 100.0 - turb_final * 10.0)  # rough transform; tweakable
     weighted = 0.4 * path_rem + 0.4 * micro_rem + 0.2 * turb_score
     return _normalize(weighted, EFFICIENCY_EXPECTED_RANGES["tertiary"]["min"], EFFICIENCY_EXPECTED_RANGES["tertiary"]["max"])
 
@@ -476,55 +870,1460 @@ def ter_objective(outputs: dict, mode: str = "balanced") -> float:
 
 def ter_feasible(outputs: dict) -> bool:
     return (
-        outputs.get("turbidity_final_NTU", np.inf) <= 3.0
-        and outputs.get("Ecoli_final_CFU_100mL", np.inf) <= 100.0
-        and outputs.get("COD_final_ter_mgL", np.inf) <= 80.0
-        and outputs.get("micropollutant_final_ugL", np.inf) <= 0.5
+        (outputs.get("turbidity_final_NTU", np.inf) <= 3.0)
+        & (outputs.get("Ecoli_final_CFU_100mL", np.inf) <= 100.0)
+        & (outputs.get("COD_final_ter_mgL", np.inf) <= 80.0)
+        & (outputs.get("micropollutant_final_ugL", np.inf) <= 0.5)
     )
 
+# reasons a candidate fails the *_feasible checks (reported when nothing is feasible)
+def failed_reasons_primary(outputs: dict) -> List[str]:
+    reasons = []
+    if outputs.get("BOD5_final_mgL", np.inf) > 60.0:
+        reasons.append(f"BOD5_final_mgL={outputs['BOD5_final_mgL']:.2f} > 60")
+    if outputs.get("COD_final_mgL", np.inf) > 150.0:
+        reasons.append(f"COD_final_mgL={outputs['COD_final_mgL']:.2f} > 150")
+    if outputs.get("TSS_final_mgL", np.inf) > 30.0:
+        reasons.append(f"TSS_final_mgL={outputs['TSS_final_mgL']:.2f} > 30")
+    return reasons
+
+def failed_reasons_bio(outputs: dict) -> List[str]:
+    reasons = []
+    if outputs.get("BOD_final_bio_mgL", np.inf) > 50.0:
+        reasons.append(f"BOD_final_bio_mgL={outputs['BOD_final_bio_mgL']:.2f} > 50")
+    if outputs.get("COD_final_bio_mgL", np.inf) > 150.0:
+        reasons.append(f"COD_final_bio_mgL={outputs['COD_final_bio_mgL']:.2f} > 150")
+    if outputs.get("NH4_final_mgL", np.inf) > 5.0:
+        reasons.append(f"NH4_final_mgL={outputs['NH4_final_mgL']:.2f} > 5")
+    return reasons
+
+def failed_reasons_ter(outputs: dict) -> List[str]:
+    reasons = []
+    if outputs.get("turbidity_final_NTU", np.inf) > 3.0:
+        reasons.append(f"turbidity_final_NTU={outputs['turbidity_final_NTU']:.2f} > 3")
+    if outputs.get("Ecoli_final_CFU_100mL", np.inf) > 100.0:
+        reasons.append(f"Ecoli_final_CFU_100mL={outputs['Ecoli_final_CFU_100mL']:.2f} > 100")
+    if outputs.get("COD_final_ter_mgL", np.inf) > 80.0:
+        reasons.append(f"COD_final_ter_mgL={outputs['COD_final_ter_mgL']:.2f} > 80")
+    if outputs.get("micropollutant_final_ugL", np.inf) > 0.5:
+        reasons.append(f"micropollutant_final_ugL={outputs['micropollutant_final_ugL']:.3f} > 0.5")
+    return reasons
+
+def _failed_reasons(feasible_check, outputs: dict) -> List[str]:
+    # choose appropriate reasoner based on feasible_check identity
+    if feasible_check == primary_feasible:
+        return failed_reasons_primary(outputs)
+    elif feasible_check == bio_feasible:
+        return failed_reasons_bio(outputs)
+    return failed_reasons_ter(outputs)
+
+# ---------------------------------------------------------
+# MULTI-OBJECTIVE (efficiency vs. energy)
+# ---------------------------------------------------------
+OPT_MODES = ("efficiency", "energy", "balanced")
+
+def pareto_front_2d(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    Indices of the non-dominated points when maximizing both a and b, ordered by a (desc).
+    Sort-and-sweep, O(n log n): after sorting by a desc (b desc on ties) a point is on
+    the front iff its b beats every b seen before it.
+    """
+    if len(a) == 0:
+        return np.empty(0, dtype=int)
+    order = np.lexsort((-b, -a))
+    b_sorted = b[order]
+    best_before = np.concatenate(([-np.inf], np.maximum.accumulate(b_sorted)[:-1]))
+    return order[b_sorted > best_before]
+
+def _spread_subset(n: int, cap: int) -> np.ndarray:
+    # evenly spaced positions (always keeping both ends) when the front exceeds the cap
+    if n <= cap:
+        return np.arange(n)
+    if cap <= 1:
+        return np.arange(min(n, cap))
+    return np.unique(np.round(np.linspace(0, n - 1, cap)).astype(int))
+
+# ---------------------------------------------------------
+# STAGE REGISTRY (used by the generic optimizer paths)
+# ---------------------------------------------------------
+STAGES = {
+    "primary": {
+        "feature_cols": PRIMARY_FEATURE_COLS, "target_cols": PRIMARY_TARGET_COLS,
+        "bounds": PRIMARY_OPT_BOUNDS, "fixed_keys": PRIMARY_FIXED_KEYS,
+        "objective": primary_objective, "feasible": primary_feasible,
+        "efficiency_metric": primary_efficiency_metric, "energy_metric": primary_energy_metric,
+        "recommend": generate_recommendations_primary,
+    },
+    "biological": {
+        "feature_cols": BIO_FEATURE_COLS, "target_cols": BIO_TARGET_COLS,
+        "bounds": BIO_OPT_BOUNDS, "fixed_keys": BIO_FIXED_KEYS,
+        "objective": bio_objective, "feasible": bio_feasible,
+        "efficiency_metric": bio_efficiency_metric, "energy_metric": bio_energy_metric,
+        "recommend": generate_recommendations_biological,
+    },
+    "tertiary": {
+        "feature_cols": TER_FEATURE_COLS, "target_cols": TER_TARGET_COLS,
+        "bounds": TER_OPT_BOUNDS, "fixed_keys": TER_FIXED_KEYS,
+        "objective": ter_objective, "feasible": ter_feasible,
+        "efficiency_metric": ter_efficiency_metric, "energy_metric": ter_energy_metric,
+        "recommend": generate_recommendations_tertiary,
+    },
+}
+
+# ---------------------------------------------------------
+# TREATMENT TRAIN (primary -> biological -> tertiary)
+# ---------------------------------------------------------
+PIPELINE_ORDER = ("primary", "biological", "tertiary")
+
+# downstream feature <- upstream model output (always applied)
+PIPELINE_LINKS = {
+    "biological": {
+        "Q_bio_mld": "Q_final_mld", "TSS_in_bio_mgL": "TSS_final_mgL",
+        "BOD5_in_bio_mgL": "BOD5_final_mgL", "COD_in_bio_mgL": "COD_final_mgL",
+    },
+    "tertiary": {
+        "BOD_in_ter_mgL": "BOD_final_bio_mgL", "COD_in_ter_mgL": "COD_final_bio_mgL",
+        "NH4_in_ter_mgL": "NH4_final_mgL", "NO3_in_ter_mgL": "NO3_final_mgL",
+    },
+}
+
+# downstream feature <- upstream input, only when the downstream payload leaves it out
+PIPELINE_CARRY = {
+    "biological": {"temp_C": "temp_C", "pH": "pH"},
+    "tertiary": {"Q_ter_mld": "Q_bio_mld", "temp_C": "temp_C", "pH_bulk": "pH"},
+}
+
+# daily energy per stage, summed for the whole plant
+PLANT_ENERGY_COLS = {
+    "primary": ["screen_energy_kwh_day", "grit_energy_kwh_day", "sed_energy_kwh_day", "daf_energy_kwh_day"],
+    "biological": ["total_bio_energy_kwh_day"],
+    "tertiary": ["tertiary_total_energy_kwh_day"],
+}
+
+def _chain_inputs(stage: str, x: np.ndarray, given, x_up: np.ndarray, y_up: np.ndarray) -> dict:
+    """
+    Fill a downstream feature matrix in place from the upstream stage's feature matrix x_up
+    and model outputs y_up (one row per plant/candidate). given(key) -> bool or per-row bool
+    array, True where the payload already set key (PIPELINE_CARRY does not overwrite those).
+    Returns key -> per-row mask of the columns written.
+    """
+    up = PIPELINE_ORDER[PIPELINE_ORDER.index(stage) - 1]
+    col = {c: j for j, c in enumerate(STAGES[stage]["feature_cols"])}
+    up_in = {c: j for j, c in enumerate(STAGES[up]["feature_cols"])}
+    up_out = {c: j for j, c in enumerate(STAGES[up]["target_cols"])}
+    n = len(x)
+    written = {}
+    for key, source in PIPELINE_LINKS[stage].items():
+        x[:, col[key]] = y_up[:, up_out[source]]
+        written[key] = np.ones(n, dtype=bool)
+    for key, source in PIPELINE_CARRY[stage].items():
+        carry = ~np.broadcast_to(np.asarray(given(key), dtype=bool), (n,))
+        x[carry, col[key]] = x_up[carry, up_in[source]]
+        written[key] = carry
+    return written
+
+def _plant_energy(ys: dict) -> dict:
+    # stage name -> kWh/day per row, plus "total"
+    energy = {}
+    for stage, cols in PLANT_ENERGY_COLS.items():
+        idx = [STAGES[stage]["target_cols"].index(c) for c in cols]
+        energy[stage] = ys[stage][:, idx].sum(axis=1)
+    energy["total"] = sum(energy[stage] for stage in PLANT_ENERGY_COLS)
+    return energy
+
+def _chain_record(stage: str, payload: dict, up_inputs: dict, up_outputs: dict) -> dict:
+    # per-candidate dict version of _chain_inputs (same links and carry rule)
+    chained = {key: float(up_outputs[source]) for key, source in PIPELINE_LINKS[stage].items()}
+    chained.update({key: float(up_inputs.get(source, 0.0)) for key, source in PIPELINE_CARRY[stage].items()
+                    if key not in payload})
+    return chained
+
+# PLANT (all three stages scored together)
+def plant_efficiency_metric(outputs: dict) -> float:
+    # outputs: stage -> outputs; mean of the stage efficiency metrics
+    return sum(STAGES[stage]["efficiency_metric"](outputs[stage]) for stage in PIPELINE_ORDER) / len(PIPELINE_ORDER)
+
+def plant_energy_metric(total_kwh_day) -> float:
+    low = sum(ENERGY_EXPECTED_RANGES[stage]["min"] for stage in PIPELINE_ORDER)
+    high = sum(ENERGY_EXPECTED_RANGES[stage]["max"] for stage in PIPELINE_ORDER)
+    return 1.0 - _normalize(total_kwh_day, low, high)
+
+def plant_objective(outputs: dict, total_kwh_day, mode: str = "balanced") -> float:
+    eff = plant_efficiency_metric(outputs)
+    eng = plant_energy_metric(total_kwh_day)
+    if mode == "efficiency":
+        combined = eff
+    elif mode == "energy":
+        combined = eng
+    else:
+        combined = 0.8 * eff + 0.2 * eng
+    return _score_to_0_100(combined)
+
+def plant_feasible(outputs: dict) -> bool:
+    # final effluent only passes when every stage meets its own limits
+    return (
+        STAGES["primary"]["feasible"](outputs["primary"])
+        & STAGES["biological"]["feasible"](outputs["biological"])
+        & STAGES["tertiary"]["feasible"](outputs["tertiary"])
+    )
+
+# ---------------------------------------------------------
+# TIME-SERIES SIMULATION
+# ---------------------------------------------------------
+# influent flow column of each stage (m3 treated for kWh/m3)
+STAGE_FLOW_COLS = {"primary": "Q_in_mld", "biological": "Q_bio_mld", "tertiary": "Q_ter_mld"}
+
+def diurnal_multiplier(hours, peak_factor: float, peak_hour: float = 9.0) -> np.ndarray:
+    """
+    Daily flow shape with mean 1 and maximum peak_factor at peak_hour:
+    exp(k cos(2 pi (h - peak_hour) / 24)) / I0(k), k solved so the peak matches.
+    Always positive, unlike a plain cosine for peak factors near 2.
+    """
+    peak_factor = float(peak_factor)
+    if peak_factor < 1.0:
+        raise InvalidArgument("peak_factor must be >= 1")
+    low, high = 0.0, 50.0
+    for _ in range(60):
+        k = (low + high) / 2.0
+        if np.exp(k) / np.i0(k) < peak_factor:
+            low = k
+        else:
+            high = k
+    phase = 2.0 * np.pi * (np.asarray(hours, dtype=float) - peak_hour) / 24.0
+    return np.exp(k * np.cos(phase)) / np.i0(k)
+
+def _simulation_column(key: str, values) -> np.ndarray:
+    try:
+        col = np.asarray(values, dtype=float)
+    except (TypeError, ValueError):
+        raise InvalidArgument(f"timeseries column '{key}' must hold numbers")
+    if col.ndim != 1:
+        raise InvalidArgument(f"timeseries column '{key}' must be a 1-D list of values")
+    return col
+
+def _simulation_plan(payload: dict, base_value, feature_cols):
+    """
+    Request -> (n_steps, timestep_h, columns(start, stop) -> {key: values for those steps}).
+      "timeseries": {"Q_in_mld": [...], ...} or [{"Q_in_mld": ...}, ...]  (NaN / missing -> settings)
+      "timestep_h": 1.0
+    or
+      "profile": {"days": 365, "timestep_h": 1.0, "keys": ["Q_in_mld"], "peak_factor": ..., "peak_hour": 9}
+    A profile multiplies the settings value of each key by diurnal_multiplier; peak_factor
+    defaults to the settings' peak_factor. Profile steps are generated per chunk.
+    Every timeseries / profile key must be a feature of a simulated stage (feature_cols).
+    """
+    def check_keys(keys):
+        unknown = sorted(k for k in keys if k not in feature_cols)
+        if unknown:
+            raise InvalidArgument(f"unknown simulation keys {unknown}")
+
+    if payload.get("timeseries") is not None:
+        ts = payload["timeseries"]
+        step_h = _robust_number(payload.get("timestep_h", 1.0), "timestep_h")
+        if isinstance(ts, list):
+            if not all(isinstance(row, dict) for row in ts):
+                raise InvalidArgument("timeseries rows must be objects")
+            keys = sorted({k for row in ts for k in row})
+            check_keys(keys)
+            values = {k: _simulation_column(k, [row.get(k, np.nan) for row in ts]) for k in keys}
+        elif isinstance(ts, dict):
+            check_keys(ts)
+            values = {k: _simulation_column(k, v) for k, v in ts.items()}
+        else:
+            raise InvalidArgument("timeseries must be an object of columns or a list of rows")
+        if not values:
+            raise InvalidArgument("timeseries has no columns")
+        lengths = {len(v) for v in values.values()}
+        if len(lengths) != 1:
+            raise InvalidArgument("timeseries columns must all have the same length")
+        n_steps = lengths.pop()
+
+        def columns(start, stop):
+            return {k: v[start:stop] for k, v in values.items()}
+    elif payload.get("profile") is not None:
+        prof = payload["profile"]
+        if not isinstance(prof, dict):
+            raise InvalidArgument("profile must be an object")
+        step_h = _robust_number(prof.get("timestep_h", 1.0), "profile timestep_h")
+        days = _robust_number(prof.get("days", 1.0), "profile days")
+        n_steps = int(round(days * 24.0 / step_h)) if step_h > 0 and days > 0 else 0
+        peak_factor = prof.get("peak_factor", base_value("peak_factor"))
+        if peak_factor is None:
+            raise InvalidArgument("profile needs peak_factor (in the profile or the settings)")
+        peak_factor = _robust_number(peak_factor, "peak_factor")
+        peak_hour = _robust_number(prof.get("peak_hour", 9.0), "profile peak_hour")
+        profile_keys = prof.get("keys", ["Q_in_mld"])
+        if not isinstance(profile_keys, list):
+            raise InvalidArgument("profile keys must be a list")
+        check_keys(profile_keys)
+        base = {}
+        for key in profile_keys:
+            base[key] = base_value(key)
+            if base[key] is None:
+                raise InvalidArgument(f"profile key '{key}' has no value in the settings")
+            base[key] = _robust_number(base[key], f"settings '{key}'")
+
+        def columns(start, stop):
+            m = diurnal_multiplier(np.arange(start, stop) * step_h, peak_factor, peak_hour)
+            return {k: float(v) * m for k, v in base.items()}
+    else:
+        raise InvalidArgument("simulation needs a timeseries or a profile")
+
+    if step_h <= 0:
+        raise InvalidArgument("timestep_h must be positive")
+    if not 0 < n_steps <= SIM_MAX_STEPS:
+        raise InvalidArgument(f"simulation needs 1 to {SIM_MAX_STEPS} steps, got {n_steps}")
+    return n_steps, step_h, columns
+
+# ---------------------------------------------------------
+# COLUMNAR CANDIDATES
+# ---------------------------------------------------------
+def _columns(y: np.ndarray, target_cols) -> dict:
+    # column views, so the dict-based metrics/feasibility checks score a whole batch
+    return {col: y[:, j] for j, col in enumerate(target_cols)}
+
+def _as_column(values, n: int, dtype) -> np.ndarray:
+    # metrics that fall back to a constant (e.g. missing target) still give one value per row
+    return np.broadcast_to(np.asarray(values, dtype=dtype), (n,))
+
+def _attach_recommendations(stage: str, cands: List[dict]) -> List[dict]:
+    # one pass of the rule table over all candidates instead of a rule walk per candidate
+    missing = [c for c in cands if "recommendations" not in c]
+    if missing:
+        outputs = {col: np.array([c["outputs"][col] for c in missing], dtype=float)
+                   for col in STAGES[stage]["target_cols"]}
+        recs = generate_recommendations_batch(stage, [c["inputs"] for c in missing], outputs)
+        for c, rec in zip(missing, recs):
+            c["recommendations"] = rec
+    return cands
+
+class CandidateFrame:
+    """
+    Columnar candidate set for one stage: sampled controllable values, model outputs,
+    objective scores and feasibility mask. Per-candidate dicts are only built by records().
+    """
+
+    def __init__(self, stage: str, base_inputs: dict, sample_bounds: dict, samples, y, scores, feasible):
+        self.stage = stage
+        self.base_inputs = base_inputs
+        self.sample_bounds = sample_bounds
+        self.keys = list(sample_bounds)
+        self.samples = samples
+        self.y = y
+        self.scores = scores
+        self.feasible = feasible
+
+    @classmethod
+    def evaluate(cls, stage: str, base_inputs: dict, sample_bounds: dict, samples, y, mode: str):
+        start = time.perf_counter()
+        spec = STAGES[stage]
+        cols = _columns(y, spec["target_cols"])
+        scores = _as_column(spec["objective"](cols, mode=mode), len(y), float)
+        feasible = _as_column(spec["feasible"](cols), len(y), bool)
+        _observe_phase(stage, "score", start)
+        _count(CANDIDATES_EVALUATED, len(y), stage)
+        _count(CANDIDATES_FEASIBLE, int(feasible.sum()), stage)
+        return cls(stage, base_inputs, sample_bounds, samples, y, scores, feasible)
+
+    @classmethod
+    def concat(cls, frames: list):
+        first = frames[0]
+        if len(frames) == 1:
+            return first
+        return cls(
+            first.stage, first.base_inputs, first.sample_bounds,
+            np.vstack([f.samples for f in frames]),
+            np.vstack([f.y for f in frames]),
+            np.concatenate([f.scores for f in frames]),
+            np.concatenate([f.feasible for f in frames]),
+        )
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def top(self, k: int, mask=None) -> np.ndarray:
+        """Indices of the k best scores (optionally among mask), best first; ties keep candidate order."""
+        idx = np.flatnonzero(mask) if mask is not None else np.arange(len(self))
+        if k <= 0 or not len(idx):
+            return idx[:0]
+        s = self.scores[idx]
+        if k < len(idx):
+            # partial selection; ties at the k-th score go to the earliest candidates
+            kth = -np.partition(-s, k - 1)[k - 1]
+            above = np.flatnonzero(s > kth)
+            ties = np.flatnonzero(s == kth)[:k - len(above)]
+            keep = np.concatenate([above, ties])
+            idx, s = idx[keep], s[keep]
+        return idx[np.lexsort((idx, -s))]
+
+    def records(self, indices) -> List[dict]:
+        target_cols = STAGES[self.stage]["target_cols"]
+        return [
+            {
+                "inputs": _candidate_inputs(self.base_inputs, self.keys, self.samples[i], self.sample_bounds),
+                "outputs": dict(zip(target_cols, self.y[i])),
+                "score": float(self.scores[i]),
+            }
+            for i in indices
+        ]
+
+    def fail_reasons(self, record: dict):
+        return _failed_reasons(STAGES[self.stage]["feasible"], record["outputs"])
+
+class PlantFrame(CandidateFrame):
+    """
+    Whole-plant candidate set: each row holds the sampled settings of all three stages
+    (keys "stage.key", blocks in PIPELINE_ORDER) and the three stages' outputs side by side.
+    base_inputs is stage -> payload. Chained influent columns are rebuilt in records().
+    """
+
+    @staticmethod
+    def qualify(stage_bounds: dict) -> dict:
+        return {f"{stage}.{key}": b for stage in PIPELINE_ORDER for key, b in stage_bounds[stage].items()}
+
+    def _blocks(self) -> dict:
+        # stage -> (sample column slice, output column slice, sampled bounds)
+        blocks, s0, y0 = {}, 0, 0
+        for stage in PIPELINE_ORDER:
+            prefix = stage + "."
+            bounds = {k[len(prefix):]: b for k, b in self.sample_bounds.items() if k.startswith(prefix)}
+            n_targets = len(STAGES[stage]["target_cols"])
+            blocks[stage] = (slice(s0, s0 + len(bounds)), slice(y0, y0 + n_targets), bounds)
+            s0, y0 = s0 + len(bounds), y0 + n_targets
+        return blocks
+
+    def records(self, indices) -> List[dict]:
+        blocks = self._blocks()
+        out = []
+        for i in indices:
+            stages, up = {}, None
+            for stage in PIPELINE_ORDER:
+                s_cols, y_cols, bounds = blocks[stage]
+                payload = self.base_inputs[stage]
+                inputs = _candidate_inputs(payload, list(bounds), self.samples[i, s_cols], bounds)
+                if up is not None:
+                    inputs.update(_chain_record(stage, payload, up["inputs"], up["outputs"]))
+                up = stages[stage] = {"inputs": inputs, "outputs": dict(zip(STAGES[stage]["target_cols"], self.y[i, y_cols]))}
+            out.append({"stages": stages, "score": float(self.scores[i])})
+        return out
+
+    def fail_reasons(self, record: dict) -> dict:
+        # stage -> reasons, for the stages that fail
+        reasons = {}
+        for stage, result in record["stages"].items():
+            check = STAGES[stage]["feasible"]
+            if not check(result["outputs"]):
+                reasons[stage] = _failed_reasons(check, result["outputs"])
+        return reasons
+
+class RobustFrame(CandidateFrame):
+    """
+    CandidateFrame scored across influent scenarios. y holds the per-candidate mean
+    outputs; scores the robust statistic (worst case, mean or a percentile of the
+    per-scenario scores); feasible is pass_share >= the requested minimum.
+    """
+
+    def __init__(self, stage: str, base_inputs: dict, sample_bounds: dict, samples, y, scores, feasible,
+                 pass_share=None, worst_scores=None, mean_scores=None):
+        super().__init__(stage, base_inputs, sample_bounds, samples, y, scores, feasible)
+        self.pass_share = pass_share
+        self.worst_scores = worst_scores
+        self.mean_scores = mean_scores
+
+    @classmethod
+    def evaluate(cls, stage: str, base_inputs: dict, sample_bounds: dict, samples, y, mode: str, robust=None):
+        """y: [n candidates * n scenarios, targets], candidate-major."""
+        start = time.perf_counter()
+        spec = STAGES[stage]
+        n, n_scen = len(samples), len(robust["values"])
+        cols = _columns(y, spec["target_cols"])
+        scen_scores = _as_column(spec["objective"](cols, mode=mode), len(y), float).reshape(n, n_scen)
+        scen_ok = _as_column(spec["feasible"](cols), len(y), bool).reshape(n, n_scen)
+        pass_share = scen_ok.mean(axis=1)
+        statistic = robust["objective"]
+        if statistic == "worst":
+            scores = scen_scores.min(axis=1)
+        elif statistic == "mean":
+            scores = scen_scores.mean(axis=1)
+        else:
+            scores = np.percentile(scen_scores, statistic, axis=1)
+        feasible = pass_share >= robust["min_pass_share"]
+        _observe_phase(stage, "score", start)
+        _count(CANDIDATES_EVALUATED, n, stage)
+        _count(CANDIDATES_FEASIBLE, int(feasible.sum()), stage)
+        return cls(stage, base_inputs, sample_bounds, samples, y.reshape(n, n_scen, y.shape[1]).mean(axis=1), scores, feasible,
+                   pass_share=pass_share, worst_scores=scen_scores.min(axis=1), mean_scores=scen_scores.mean(axis=1))
+
+    @classmethod
+    def concat(cls, frames: list):
+        first = frames[0]
+        if len(frames) == 1:
+            return first
+        return cls(
+            first.stage, first.base_inputs, first.sample_bounds,
+            np.vstack([f.samples for f in frames]),
+            np.vstack([f.y for f in frames]),
+            np.concatenate([f.scores for f in frames]),
+            np.concatenate([f.feasible for f in frames]),
+            pass_share=np.concatenate([f.pass_share for f in frames]),
+            worst_scores=np.concatenate([f.worst_scores for f in frames]),
+            mean_scores=np.concatenate([f.mean_scores for f in frames]),
+        )
+
+    def records(self, indices) -> List[dict]:
+        out = super().records(indices)
+        for c, i in zip(out, indices):
+            c["robust"] = {
+                "pass_share": float(self.pass_share[i]),
+                "worst_score": float(self.worst_scores[i]),
+                "mean_score": float(self.mean_scores[i]),
+            }
+        return out
+
+    def fail_reasons(self, record: dict):
+        # reasons from the scenario-mean outputs, after the pass share itself
+        share = record["robust"]["pass_share"]
+        return [f"scenario pass share={share:.2f}"] + super().fail_reasons(record)
+
+def _robust_number(value, what: str) -> float:
+    # request field -> finite float, else a 400
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise InvalidArgument(f"{what} must be a number")
+    if not np.isfinite(value):
+        raise InvalidArgument(f"{what} must be finite")
+    return value
+
+def _draw_scenario_column(key: str, dist: dict, base_inputs: dict, n: int, rng) -> np.ndarray:
+    if not isinstance(dist, dict):
+        raise InvalidArgument(f"scenario distribution for '{key}' must be an object")
+    kind = dist.get("dist", "normal")
+    center = dist.get("mean", dist.get("mode", base_inputs.get(key)))
+    if kind == "normal":
+        if center is None or "std" not in dist:
+            raise InvalidArgument(f"normal scenario distribution for '{key}' needs std and a mean (or a current value)")
+        mean = _robust_number(center, f"'{key}' mean")
+        std = _robust_number(dist["std"], f"'{key}' std")
+        if std < 0:
+            raise InvalidArgument(f"'{key}' std must be >= 0")
+        col = rng.normal(mean, std, size=n)
+        # optional truncation, e.g. a flow that cannot go negative
+        low = _robust_number(dist["low"], f"'{key}' low") if "low" in dist else -np.inf
+        high = _robust_number(dist["high"], f"'{key}' high") if "high" in dist else np.inf
+        return np.clip(col, low, high)
+    if kind not in ROBUST_DISTRIBUTIONS:
+        raise InvalidArgument(f"unknown scenario distribution '{kind}', expected one of {ROBUST_DISTRIBUTIONS}")
+    if "low" not in dist or "high" not in dist:
+        raise InvalidArgument(f"{kind} scenario distribution for '{key}' needs low and high")
+    low = _robust_number(dist["low"], f"'{key}' low")
+    high = _robust_number(dist["high"], f"'{key}' high")
+    if kind == "uniform":
+        if low > high:
+            raise InvalidArgument(f"'{key}' low must be <= high")
+        return rng.uniform(low, high, size=n)
+    if center is None:
+        raise InvalidArgument(f"triangular scenario distribution for '{key}' needs a mode (or a current value)")
+    mode = _robust_number(center, f"'{key}' mode")
+    if not low <= mode <= high or low == high:
+        raise InvalidArgument(f"'{key}' needs low <= mode <= high with low < high")
+    return rng.triangular(low, mode, high, size=n)
+
+def _robust_options(stage: str, base_inputs: dict, value, seed=None):
+    """
+    Request "robust" -> {"keys", "values" [n scenarios, keys], "objective", "min_pass_share"}, or None.
+      {"scenarios": [{"Q_in_mld": 14.0, ...}, ...]}                  explicit influent overrides, or
+      {"distributions": {"Q_in_mld": {"dist": "normal", "std": 2.0}, ...},
+       "n_scenarios": 32, "seed": 0}                                  sampled scenarios
+    plus "objective": "worst" | "mean" | percentile 0-100 (default "worst") and
+    "min_pass_share" (default 1.0: feasible in every scenario).
+    Keys missing from an explicit scenario keep the current value.
+    Malformed specs raise InvalidArgument before anything is drawn.
+    """
+    if not value:
+        return None
+    if not isinstance(value, dict):
+        raise InvalidArgument("robust must be an object")
+    spec = STAGES[stage]
+    sampled = _sample_bounds(base_inputs, spec["bounds"], spec["fixed_keys"])
+
+    def check_keys(keys):
+        if not keys:
+            raise InvalidArgument("robust needs at least one scenario key and one scenario")
+        for key in keys:
+            if key not in spec["feature_cols"]:
+                raise InvalidArgument(f"unknown {stage} scenario key '{key}'")
+            if key in sampled:
+                raise InvalidArgument(f"scenario key '{key}' is a setting the optimizer samples; fix it in current_config first")
+
+    if "scenarios" in value:
+        scenarios = value["scenarios"]
+        if not isinstance(scenarios, list) or not all(isinstance(sc, dict) for sc in scenarios):
+            raise InvalidArgument("robust scenarios must be a list of objects")
+        if not 0 < len(scenarios) <= ROBUST_MAX_SCENARIOS:
+            raise InvalidArgument(f"robust needs 1 to {ROBUST_MAX_SCENARIOS} scenarios, got {len(scenarios)}")
+        keys = sorted({k for scenario in scenarios for k in scenario})
+        check_keys(keys)
+        values = np.array([[_robust_number(scenario.get(k, base_inputs.get(k, 0.0)), f"scenario {i} '{k}'") for k in keys]
+                           for i, scenario in enumerate(scenarios)], dtype=float)
+    else:
+        distributions = value.get("distributions", {})
+        if not isinstance(distributions, dict):
+            raise InvalidArgument("robust distributions must be an object of key -> distribution")
+        keys = list(distributions)
+        check_keys(keys)
+        n = value.get("n_scenarios", ROBUST_SCENARIOS)
+        if isinstance(n, bool) or not isinstance(n, (int, float)) or not 0 < n <= ROBUST_MAX_SCENARIOS or n != int(n):
+            raise InvalidArgument(f"robust n_scenarios must be an integer from 1 to {ROBUST_MAX_SCENARIOS}")
+        n = int(n)
+        try:
+            rng = np.random.default_rng(value.get("seed", seed))
+        except (TypeError, ValueError) as e:
+            raise InvalidArgument(f"invalid robust seed: {e}")
+        values = np.empty((n, len(keys)))
+        for j, key in enumerate(keys):
+            values[:, j] = _draw_scenario_column(key, distributions[key], base_inputs, n, rng)
+
+    objective = value.get("objective", "worst")
+    if objective not in ("worst", "mean"):
+        try:
+            objective = float(objective)
+        except (TypeError, ValueError):
+            objective = -1.0
+        if not 0.0 <= objective <= 100.0:
+            raise InvalidArgument("robust objective must be 'worst', 'mean' or a percentile in [0, 100]")
+    min_pass_share = _robust_number(value.get("min_pass_share", 1.0), "robust min_pass_share")
+    if not 0.0 <= min_pass_share <= 1.0:
+        raise InvalidArgument("robust min_pass_share must be in [0, 1]")
+    return {"keys": keys, "values": values, "objective": objective, "min_pass_share": min_pass_share}
+
+def _screening_options(value):
+    # request "screening": true / {"fidelity": f, "keep": k} -> options dict, or None when off
+    if not value:
+        return None
+    opts = value if isinstance(value, dict) else {}
+    fidelity = _robust_number(opts.get("fidelity", SCREEN_FIDELITY), "screening fidelity")
+    keep = _robust_number(opts.get("keep", SCREEN_KEEP), "screening keep")
+    if not (0.0 < fidelity <= 1.0 and 0.0 < keep <= 1.0):
+        raise InvalidArgument("screening fidelity and keep must be in (0, 1]")
+    return {"fidelity": fidelity, "keep": keep}
+
+def _sweep_axis(stage: str, axis: dict):
+    """
+    One sweep axis -> (key, values). Either explicit "values" or "low"/"high"/"num"
+    (defaults: the key's OPT_BOUNDS and SWEEP_DEFAULT_POINTS). Integer-bounded keys are
+    rounded and deduplicated. Point counts are checked against SWEEP_MAX_POINTS before allocating.
+    """
+    bounds = STAGES[stage]["bounds"]
+    if not isinstance(axis, dict):
+        raise InvalidArgument("sweep axes must be objects")
+    key = axis.get("key")
+    if key not in bounds:
+        raise InvalidArgument(f"sweep key '{key}' is not a {stage} optimization parameter, expected one of {list(bounds)}")
+    low, high = bounds[key]
+    if "values" in axis:
+        if not isinstance(axis["values"], list):
+            raise InvalidArgument(f"sweep axis '{key}' values must be a list")
+        if len(axis["values"]) > SWEEP_MAX_POINTS:
+            raise InvalidArgument(f"sweep axis '{key}' has more than {SWEEP_MAX_POINTS} values")
+        try:
+            values = np.asarray(axis["values"], dtype=float).ravel()
+        except (TypeError, ValueError):
+            raise InvalidArgument(f"sweep axis '{key}' values must be numbers")
+        if len(values) > SWEEP_MAX_POINTS:
+            raise InvalidArgument(f"sweep axis '{key}' has more than {SWEEP_MAX_POINTS} values")
+    else:
+        num = _robust_number(axis.get("num", SWEEP_DEFAULT_POINTS), f"sweep axis '{key}' num")
+        if not 1 <= num <= SWEEP_MAX_POINTS or num != int(num):
+            raise InvalidArgument(f"sweep axis '{key}' num must be an integer in [1, {SWEEP_MAX_POINTS}]")
+        lo = _robust_number(axis.get("low", low), f"sweep axis '{key}' low")
+        hi = _robust_number(axis.get("high", high), f"sweep axis '{key}' high")
+        values = np.linspace(lo, hi, int(num))
+    if _is_int_bound(low, high):
+        values = np.unique(np.rint(values))
+    if not len(values):
+        raise InvalidArgument(f"sweep axis '{key}' has no values")
+    return key, values
+
+# ---------------------------------------------------------
+# PREDICTION CACHE
+# ---------------------------------------------------------
+def _cache_resolution(feature_cols):
+    # None -> exact keys
+    if not CACHE_QUANTIZE:
+        return None
+    return np.array([CACHE_FEATURE_RESOLUTION.get(col, CACHE_DEFAULT_RESOLUTION) for col in feature_cols], dtype=float)
+
+class PredictionCache:
+    """
+    Bounded LRU cache of model outputs keyed by (stage, feature vector), exact or quantized
+    per column (resolution). Misses within one call are predicted together in a single model.predict.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def predict(self, stage: str, model, x: np.ndarray, resolution=None) -> np.ndarray:
+        q = np.ascontiguousarray(x, dtype=float) if resolution is None else np.round(x / resolution).astype(np.int64)
+        keys = [(stage, row.tobytes()) for row in q]
+        rows = [None] * len(keys)
+        miss_idx = {}
+        with self._lock:
+            for i, key in enumerate(keys):
+                y = self._entries.get(key)
+                if y is None:
+                    # duplicate rows in the same batch are predicted once
+                    miss_idx.setdefault(key, i)
+                else:
+                    self._entries.move_to_end(key)
+                    rows[i] = y
+            self.hits += len(keys) - len(miss_idx)
+            self.misses += len(miss_idx)
+        _count(CACHE_LOOKUPS, len(keys) - len(miss_idx), stage, "hit")
+        _count(CACHE_LOOKUPS, len(miss_idx), stage, "miss")
+
+        if miss_idx:
+            first = list(miss_idx.values())
+            y_miss = model.predict(x[first])
+            # copies, so a cached row doesn't keep the whole y_miss batch alive
+            fresh = {key: y.copy() for key, y in zip(miss_idx.keys(), y_miss)}
+            with self._lock:
+                for key, y in fresh.items():
+                    self._entries[key] = y
+                    self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            for i, key in enumerate(keys):
+                if rows[i] is None:
+                    rows[i] = fresh[key]
+        return np.vstack(rows)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+# ---------------------------------------------------------
+# WARM-START INDEX
+# ---------------------------------------------------------
+class WarmStartIndex:
+    """
+    Bounded nearest-neighbour memory of feasible optimizer results per (stage, mode).
+    Keys are the stage's fixed influent values (signed log1p, compared in units of the
+    stored keys' per-column spread); values are the controllable settings in OPT_BOUNDS
+    order. Oldest entries are dropped first. At this size an exact vectorized distance
+    scan is cheaper than keeping a tree up to date under inserts.
+    Modes outside OPT_MODES are scored as "balanced" and stored under it.
+    """
+
+    def __init__(self, max_entries: int, path: str = None):
+        self.max_entries = max_entries
+        self.path = path
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # one writer at a time, so an older snapshot never lands last
+        self._keys = {}
+        self._values = {}
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        if path and os.path.exists(path):
+            try:
+                self.load(path)
+            except Exception as e:
+                # a damaged file must not keep the service from starting
+                logger.warning("warm-start index %s not loaded, starting empty: %s", path, e)
+                self._keys, self._values = {}, {}
+
+    @staticmethod
+    def _mode(mode: str) -> str:
+        return mode if mode in OPT_MODES else "balanced"
+
+    @staticmethod
+    def _key_vector(stage: str, inputs: dict) -> np.ndarray:
+        x = np.array([_as_float(inputs.get(k, 0.0)) for k in STAGES[stage]["fixed_keys"]], dtype=float)
+        return np.sign(x) * np.log1p(np.abs(x))
+
+    def add(self, stage: str, mode: str, base_inputs: dict, candidates: List[dict]) -> None:
+        bounds = STAGES[stage]["bounds"]
+        rows = [[_as_float(c["inputs"].get(k)) for k in bounds] for c in candidates]
+        if not rows:
+            return
+        key = self._key_vector(stage, base_inputs)
+        sm = (stage, self._mode(mode))
+        with self._lock:
+            keys = np.repeat(key[None, :], len(rows), axis=0)
+            values = np.asarray(rows, dtype=float)
+            if sm in self._keys:
+                keys = np.vstack([self._keys[sm], keys])
+                values = np.vstack([self._values[sm], values])
+            self._keys[sm] = keys[-self.max_entries:]
+            self._values[sm] = values[-self.max_entries:]
+            self._dirty = True
+        self._maybe_save()
+
+    def nearest(self, stage: str, mode: str, base_inputs: dict, k: int = WARMSTART_NEIGHBORS,
+                radius: float = WARMSTART_RADIUS):
+        # -> (values [<=k, n_bounds], distances), nearest first, only within radius
+        mode = self._mode(mode)
+        with self._lock:
+            keys = self._keys.get((stage, mode))
+            values = self._values.get((stage, mode))
+        if keys is None:
+            return np.empty((0, len(STAGES[stage]["bounds"]))), np.empty(0)
+        spread = keys.std(axis=0)
+        spread[spread < 1e-9] = 1.0
+        d = np.sqrt(np.mean(((keys - self._key_vector(stage, base_inputs)) / spread) ** 2, axis=1))
+        order = np.argsort(d, kind="stable")[:k]
+        order = order[d[order] <= radius]
+        return values[order], d[order]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_entries": self.max_entries,
+                "path": self.path,
+                "entries": {f"{stage}/{mode}": len(keys) for (stage, mode), keys in self._keys.items()},
+            }
+
+    def _snapshot(self) -> dict:
+        # caller holds self._lock; stage and mode are stored as arrays, not in the array names
+        arrays = {"stages": np.array([stage for stage, _ in self._keys], dtype=str),
+                  "modes": np.array([mode for _, mode in self._keys], dtype=str)}
+        for i, sm in enumerate(self._keys):
+            arrays[f"keys_{i}"] = self._keys[sm]
+            arrays[f"values_{i}"] = self._values[sm]
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        return arrays
+
+    @staticmethod
+    def _write(path: str, arrays: dict) -> None:
+        # unique temp file in the target directory, then an atomic replace
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, **arrays)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def save(self, path: str = None) -> None:
+        with self._save_lock:
+            with self._lock:
+                arrays = self._snapshot()
+            self._write(path or self.path, arrays)
+
+    def load(self, path: str) -> None:
+        with np.load(path) as data:
+            stages, modes = [str(x) for x in data["stages"]], [str(x) for x in data["modes"]]
+            for i, (stage, mode) in enumerate(zip(stages, modes)):
+                if stage not in STAGES or mode not in OPT_MODES:
+                    continue
+                keys, values = data[f"keys_{i}"], data[f"values_{i}"]
+                # entries written for a different set of fixed keys / bounds are skipped
+                if keys.shape[1] != len(STAGES[stage]["fixed_keys"]) or values.shape[1] != len(STAGES[stage]["bounds"]):
+                    logger.warning("warm-start entries for %s/%s do not match the current columns, skipped", stage, mode)
+                    continue
+                with self._lock:
+                    self._keys[(stage, mode)] = keys[-self.max_entries:]
+                    self._values[(stage, mode)] = values[-self.max_entries:]
+
+    def _maybe_save(self) -> None:
+        # due check and _dirty reset under the lock; a save already running is not waited for
+        if not self.path or not self._save_lock.acquire(blocking=False):
+            return
+        try:
+            with self._lock:
+                if not self._dirty or time.monotonic() - self._saved_at < WARMSTART_SAVE_INTERVAL_S:
+                    return
+                arrays = self._snapshot()
+            try:
+                self._write(self.path, arrays)
+            except OSError as e:
+                with self._lock:
+                    self._dirty = True
+                logger.warning("warm-start index not saved to %s: %s", self.path, e)
+        finally:
+            self._save_lock.release()
+
+# ---------------------------------------------------------
+# COMPILED TREE INFERENCE (flat node arrays, vectorized traversal)
+# ---------------------------------------------------------
+class CompiledEnsemble:
+    """
+    All trees of a (multi-output) gradient-boosted ensemble flattened into contiguous
+    node arrays. Leaves point to themselves, so max_depth vectorized steps reach every leaf.
+    children holds node i's left child at 2*i and its right child at 2*i + 1, so one gather
+    takes a step. Leaf values are pre-multiplied by the learning rate; trees are grouped per target.
+    """
+
+    def __init__(self, feature, threshold, children, value, roots, target_starts, max_depth, preprocess=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.value = value
+        self.roots = roots
+        self.target_starts = target_starts
+        self.max_depth = max_depth
+        self.preprocess = preprocess
+        self.offsets = np.zeros(len(target_starts), dtype=float)
+        self.chunk_rows = max(1, COMPILED_CHUNK_CELLS // max(1, len(roots)))
+        self.fallback = None
+        self.fallback_rows = None
+
+    @property
+    def n_stages(self) -> int:
+        # boosting stages of the longest per-target ensemble
+        return int(np.max(np.diff(np.append(self.target_starts, len(self.roots)))))
+
+    def truncated(self, n_stages: int) -> "CompiledEnsemble":
+        """
+        Same ensemble limited to its first n_stages trees per target (staged prediction).
+        Node arrays are shared, only the root list is cut; there is no sklearn fallback.
+        """
+        counts = np.diff(np.append(self.target_starts, len(self.roots)))
+        roots = [self.roots[start:start + min(n_stages, count)] for start, count in zip(self.target_starts, counts)]
+        starts = np.cumsum([0] + [len(r) for r in roots[:-1]]).astype(np.intp)
+        engine = CompiledEnsemble(self.feature, self.threshold, self.children, self.value,
+                                  np.concatenate(roots), starts, self.max_depth, preprocess=self.preprocess)
+        engine.offsets = self.offsets
+        return engine
+
+    def _raw_predict(self, x):
+        # sklearn trees compare float32 features against float64 thresholds
+        x = np.ascontiguousarray(x, dtype=np.float32)
+        n, n_features = x.shape
+        flat = x.ravel()
+        row_base = (np.arange(n) * n_features)[:, None]
+        node = np.repeat(self.roots[None, :], n, axis=0)
+        for _ in range(self.max_depth):
+            # np.take on flat indices is cheaper than 2-D fancy indexing
+            go_right = ~(np.take(flat, row_base + np.take(self.feature, node)) <= np.take(self.threshold, node))
+            node = np.take(self.children, 2 * node + go_right)
+        # sklearn adds the stages one at a time onto the init prediction; a cumsum
+        # starting from the offset keeps that order, so results are bit-identical
+        leaf = np.take(self.value, node)
+        ends = np.append(self.target_starts, len(self.roots))
+        out = np.empty((n, len(self.target_starts)))
+        for k, (start, end) in enumerate(zip(ends[:-1], ends[1:])):
+            terms = np.concatenate([np.full((n, 1), self.offsets[k]), leaf[:, start:end]], axis=1)
+            out[:, k] = np.cumsum(terms, axis=1)[:, -1]
+        return out
+
+    def predict(self, x):
+        if self.fallback is not None and self.fallback_rows and len(x) >= self.fallback_rows:
+            return self.fallback.predict(x)
+        if self.preprocess is not None:
+            x = self.preprocess.transform(x)
+        x = np.asarray(x, dtype=float)
+        if x.shape[0] <= self.chunk_rows:
+            return self._raw_predict(x)
+        # chunk_rows keeps the (rows x trees) node matrix near COMPILED_CHUNK_CELLS
+        parts = [self._raw_predict(x[i:i + self.chunk_rows]) for i in range(0, x.shape[0], self.chunk_rows)]
+        return np.vstack(parts)
+
+def _gbr_stages(est):
+    # (init raw prediction, [(tree_, scale) for every fitted stage]) of a single-output GradientBoostingRegressor
+    from sklearn.dummy import DummyRegressor
+    from sklearn.ensemble import GradientBoostingRegressor
+    if not isinstance(est, GradientBoostingRegressor):
+        raise TypeError(f"unsupported estimator {type(est).__name__}")
+    if not (isinstance(est.init_, str) and est.init_ == "zero") and not isinstance(est.init_, DummyRegressor):
+        # only a constant init can be folded into one offset per target
+        raise TypeError(f"unsupported init estimator {type(est.init_).__name__}")
+    init = float(est._raw_predict_init(np.zeros((1, est.n_features_in_), dtype=np.float32))[0, 0])
+    return init, [(stage[0].tree_, est.learning_rate) for stage in est.estimators_]
+
+def _ensemble_stages(model):
+    # -> (preprocess, [stages per target])
+    from sklearn.multioutput import MultiOutputRegressor
+    from sklearn.pipeline import Pipeline
+    preprocess = None
+    if isinstance(model, Pipeline):
+        preprocess = model[:-1] if len(model.steps) > 1 else None
+        model = model.steps[-1][1]
+    if isinstance(model, MultiOutputRegressor):
+        return preprocess, [_gbr_stages(est) for est in model.estimators_]
+    return preprocess, [_gbr_stages(model)]
+
+def compile_ensemble(model, n_check: int = 256, seed: int = 0) -> CompiledEnsemble:
+    """
+    Convert a loaded GradientBoostingRegressor / MultiOutputRegressor (optionally the last
+    step of a Pipeline) into a CompiledEnsemble, then check it against model.predict.
+    Raises TypeError for unsupported models and ValueError unless outputs are bit-identical.
+    """
+    preprocess, per_target = _ensemble_stages(model)
+    feature, threshold, children, value = [], [], [], []
+    roots, target_starts = [], []
+    offset = 0
+    max_depth = 0
+    for _, stages in per_target:
+        target_starts.append(len(roots))
+        for tree, scale in stages:
+            leaf = tree.children_left == -1
+            idx = np.arange(tree.node_count)
+            roots.append(offset)
+            feature.append(np.where(leaf, 0, tree.feature))
+            threshold.append(np.where(leaf, 0.0, tree.threshold))
+            left = np.where(leaf, idx, tree.children_left) + offset
+            right = np.where(leaf, idx, tree.children_right) + offset
+            children.append(np.column_stack([left, right]).ravel())
+            value.append(tree.value[:, 0, 0] * scale)
+            max_depth = max(max_depth, tree.max_depth)
+            offset += tree.node_count
+
+    engine = CompiledEnsemble(
+        feature=np.concatenate(feature).astype(np.intp),
+        threshold=np.concatenate(threshold).astype(np.float64),
+        children=np.concatenate(children).astype(np.intp),
+        value=np.concatenate(value).astype(np.float64),
+        roots=np.asarray(roots, dtype=np.intp),
+        target_starts=np.asarray(target_starts, dtype=np.intp),
+        max_depth=max_depth,
+        preprocess=preprocess,
+    )
+    engine.offsets = np.array([init for init, _ in per_target], dtype=float)
+
+    # probe rows spread over each feature's split range exercise both branches
+    n_features = model.n_features_in_
+    rng = np.random.default_rng(seed)
+    lo = np.zeros(n_features)
+    hi = np.ones(n_features)
+    split = engine.children[0::2] != np.arange(len(engine.feature))
+    for f in range(n_features):
+        th = engine.threshold[split & (engine.feature == f)]
+        if th.size:
+            lo[f], hi[f] = th.min() - 1.0, th.max() + 1.0
+    probe = lo + (hi - lo) * rng.random((n_check, n_features))
+    if preprocess is not None:
+        # thresholds live in the transformed space; check on raw-scale rows instead
+        probe = rng.normal(size=(n_check, n_features))
+
+    expected = np.asarray(model.predict(probe), dtype=float).reshape(n_check, -1)
+    got = engine.predict(probe)
+    if not np.array_equal(got, expected):
+        err = float(np.max(np.abs(got - expected)))
+        raise ValueError(f"compiled ensemble disagrees with model.predict (max abs err {err:.3g})")
+    return engine
+
+def _select_backend(stage: str, model):
+    backend = INFERENCE_BACKENDS.get(stage, "sklearn")
+    if backend != "compiled":
+        return model
+    try:
+        start = time.perf_counter()
+        engine = compile_ensemble(model)
+        engine.fallback = model
+        engine.fallback_rows = COMPILED_FALLBACK_ROWS
+        logger.info("%s model compiled to flat-array trees in %.1f ms", stage, (time.perf_counter() - start) * 1000.0)
+        return engine
+    except (TypeError, ValueError) as e:
+        logger.warning("%s model not compiled, using sklearn predict: %s", stage, e)
+        return model
+
+def _shared_model_dir(stage: str) -> str:
+    # keyed by the model file's size and mtime, so a redeployed model gets a fresh export
+    st = os.stat(MODEL_PATHS[stage])
+    return os.path.join(SHARED_MODEL_DIR, f"{stage}-v{SHARED_FORMAT}-{st.st_size}-{st.st_mtime_ns}")
+
+def export_shared(engine: CompiledEnsemble, path: str) -> None:
+    """
+    Write a CompiledEnsemble's node arrays as .npy files plus a small metadata pickle.
+    The directory is published with a rename, so concurrent workers never see a partial export.
+    """
+    tmp = tempfile.mkdtemp(prefix=".export-", dir=os.path.dirname(path))
+    for name in SHARED_ARRAYS:
+        np.save(os.path.join(tmp, f"{name}.npy"), getattr(engine, name))
+    meta = {"max_depth": engine.max_depth, "offsets": engine.offsets, "preprocess": engine.preprocess}
+    joblib.dump(meta, os.path.join(tmp, "meta.pkl"))
+    try:
+        os.rename(tmp, path)
+    except OSError:
+        # another worker published first; both exports come from the same model file
+        shutil.rmtree(tmp, ignore_errors=True)
+
+def attach_shared(path: str) -> CompiledEnsemble:
+    # node arrays stay in the shared page cache; only the metadata is per-process
+    arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in SHARED_ARRAYS}
+    meta = joblib.load(os.path.join(path, "meta.pkl"))
+    engine = CompiledEnsemble(**arrays, max_depth=meta["max_depth"], preprocess=meta["preprocess"])
+    engine.offsets = meta["offsets"]
+    return engine
+
+def _shared_engine(stage: str):
+    # attach to this host's export, publishing it first if no worker has yet.
+    # Models that can't be compiled come back as the plain sklearn model.
+    path = _shared_model_dir(stage)
+    if not os.path.isdir(path):
+        os.makedirs(SHARED_MODEL_DIR, exist_ok=True)
+        model = joblib.load(MODEL_PATHS[stage])
+        try:
+            engine = compile_ensemble(model)
+        except (TypeError, ValueError) as e:
+            logger.warning("%s model not shared, loading it per worker: %s", stage, e)
+            return model
+        export_shared(engine, path)
+        logger.info("%s model exported to %s", stage, path)
+    return attach_shared(path)
+
+def _warmup_row(stage: str) -> np.ndarray:
+    # optimizer bounds midpoints; columns without bounds only need a finite value
+    row = {}
+    for key, (low, high) in STAGES[stage]["bounds"].items():
+        mid = (low + high) / 2.0
+        row[key] = float(round(mid)) if _is_int_bound(low, high) else mid
+    return _build_feature_array(row, STAGES[stage]["feature_cols"])
+
+def _load_stage_model(stage: str):
+    # load, optional compile and warm-up for one stage -> (model, timings)
+    start = time.perf_counter()
+    # an explicit per-stage sklearn choice wins over sharing
+    shared = SHARED_MODELS and os.environ.get(f"AQUASMART_{stage.upper()}_BACKEND") != "sklearn"
+    if SHARED_MODELS and not shared:
+        logger.info("%s model not shared: AQUASMART_%s_BACKEND=sklearn", stage, stage.upper())
+    if shared:
+        # shared engines have no sklearn fallback, so every batch size runs on the mapped arrays
+        # (compile_ensemble only accepts engines that match model.predict bit for bit); large
+        # batches are slower than sklearn there, so keep sharing for memory-bound deployments
+        model = _shared_engine(stage)
+        loaded = ready = time.perf_counter()
+        backend = "shared" if isinstance(model, CompiledEnsemble) else "sklearn"
+    else:
+        model = joblib.load(MODEL_PATHS[stage])
+        loaded = time.perf_counter()
+        model = _select_backend(stage, model)
+        ready = time.perf_counter()
+        backend = "compiled" if isinstance(model, CompiledEnsemble) else "sklearn"
+    stats = {
+        "backend": backend,
+        "load_ms": (loaded - start) * 1000.0,
+        "compile_ms": (ready - loaded) * 1000.0,
+        "warmup_ms": None,
+    }
+    if MODEL_WARMUP:
+        x = _warmup_row(stage)
+        model.predict(x)
+        if isinstance(model, CompiledEnsemble) and model.fallback is not None:
+            model.fallback.predict(x)
+        stats["warmup_ms"] = (time.perf_counter() - ready) * 1000.0
+    return model, stats
+
+# ---------------------------------------------------------
+# BOUNDED OFFLOAD (async endpoints)
+# ---------------------------------------------------------
+class BoundedExecutor:
+    """
+    Thread pool with admission control: at most max_workers calls run and max_queue wait.
+    Further calls are rejected with ServiceUnavailable (HTTP 503) instead of queueing.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self.limit = self.max_workers + max(0, max_queue)
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"aquasmart-{name}")
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def _release(self, _future) -> None:
+        with self._lock:
+            self.pending -= 1
+            self.completed += 1
+
+    async def run(self, fn, *args):
+        with self._lock:
+            if self.pending >= self.limit:
+                self.rejected += 1
+                raise ServiceUnavailable(f"{self.name} capacity exhausted ({self.limit} calls in flight), retry later")
+            self.pending += 1
+        # released when the work finishes (or is cancelled before starting), not when the client goes away
+        future = self.executor.submit(fn, *args)
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "limit": self.limit,
+                "in_flight": self.pending,
+                "completed": self.completed,
+                "rejected": self.rejected,
+            }
+
 # ---------------------------------------------------------
 # BENTOML SERVICE
 # ---------------------------------------------------------
 @bentoml.service(name="aquasmart_service")
 class AquaSmartService:
     def __init__(self):
-        # Load models once
-        self.primary_model = joblib.load(PRIMARY_MODEL_PATH)
-        self.biological_model = joblib.load(BIO_MODEL_PATH)
-        self.tertiary_model = joblib.load(TERTIARY_MODEL_PATH)
+        # Load models once (concurrently; compiled backend and warm-up run per stage)
+        start = time.perf_counter()
+        workers = max(1, min(MODEL_LOAD_WORKERS, len(STAGE_NAMES)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="aquasmart-load") as pool:
+            loaded = dict(zip(STAGE_NAMES, pool.map(_load_stage_model, STAGE_NAMES)))
+        self.primary_model = loaded["primary"][0]
+        self.biological_model = loaded["biological"][0]
+        self.tertiary_model = loaded["tertiary"][0]
+        self.startup = {
+            "total_ms": (time.perf_counter() - start) * 1000.0,
+            "shared_dir": SHARED_MODEL_DIR if SHARED_MODELS else None,
+            "warmup": MODEL_WARMUP,
+            "stages": {stage: stats for stage, (_, stats) in loaded.items()},
+        }
+        for stage, stats in self.startup["stages"].items():
+            logger.info("%s model ready (%s): load %.1f ms, compile %.1f ms, warm-up %s",
+                        stage, stats["backend"], stats["load_ms"], stats["compile_ms"],
+                        "off" if stats["warmup_ms"] is None else f"{stats['warmup_ms']:.1f} ms")
+        logger.info("models ready in %.1f ms", self.startup["total_ms"])
+
+        # direct, batch and pipeline predictions; optimizer candidates bypass it (see _predict)
+        self.cache = PredictionCache(PREDICTION_CACHE_SIZE) if PREDICTION_CACHE_SIZE > 0 else None
+        self.cache_resolution = {stage: _cache_resolution(spec["feature_cols"]) for stage, spec in STAGES.items()}
+
+        # candidate evaluation pool for large optimizer searches
+        self.opt_pool = ThreadPoolExecutor(max_workers=OPT_WORKERS, thread_name_prefix="aquasmart-opt") if OPT_WORKERS > 1 else None
+
+        # separate offload pools, so long optimizations never hold the prediction slots
+        self.predict_pool = BoundedExecutor("predict", PREDICT_CONCURRENCY, PREDICT_QUEUE)
+        self.optimize_pool = BoundedExecutor("optimize", OPTIMIZE_CONCURRENCY, OPTIMIZE_QUEUE)
+
+        # truncated-ensemble surrogates for screening, built on first use per (stage, stages)
+        self._surrogates = {}
+        self._surrogate_lock = threading.Lock()
+
+        # past feasible optima by influent regime, used to seed new searches
+        self.warm_index = WarmStartIndex(WARMSTART_SIZE, WARMSTART_PATH) if WARMSTART_SIZE > 0 else None
+
+    @bentoml.on_shutdown
+    def _save_warm_index(self):
+        if self.warm_index is not None and self.warm_index.path:
+            self.warm_index.save()
+
+    def _predict(self, stage: str, x: np.ndarray, cached: bool = False) -> np.ndarray:
+        # cached=True only for client-supplied rows, so candidate batches don't evict them
+        start = time.perf_counter()
+        model = getattr(self, f"{stage}_model")
+        if self.cache is None or not cached:
+            y = model.predict(x)
+        else:
+            y = self.cache.predict(stage, model, x, self.cache_resolution[stage])
+        _observe_phase(stage, "predict", start)
+        return y
 
     # ---------- direct endpoints ----------
-    @bentoml.api
-    def primary(self, request_json: dict) -> dict:
+    def _predict_response(self, stage: str, request_json: dict) -> dict:
+        # plain method, so the *_async endpoints can run it on a pool thread
+        spec = STAGES[stage]
         payload = _unwrap_payload(request_json)
-        x = _build_feature_array(payload, PRIMARY_FEATURE_COLS)
-        y_pred = self.primary_model.predict(x)[0]
-        outputs = dict(zip(PRIMARY_TARGET_COLS, y_pred))
-        recs = generate_recommendations_primary(payload, outputs)
+        x = _build_feature_array(payload, spec["feature_cols"])
+        y_pred = self._predict(stage, x, cached=True)[0]
+        outputs = dict(zip(spec["target_cols"], y_pred))
+        recs = spec["recommend"](payload, outputs)
         return {"outputs": outputs, "recommendations": recs}
 
+    @bentoml.api
+    def primary(self, request_json: dict) -> dict:
+        return self._predict_response("primary", request_json)
+
     @bentoml.api
     def biological(self, request_json: dict) -> dict:
-        payload = _unwrap_payload(request_json)
-        x = _build_feature_array(payload, BIO_FEATURE_COLS)
-        y_pred = self.biological_model.predict(x)[0]
-        outputs = dict(zip(BIO_TARGET_COLS, y_pred))
-        recs = generate_recommendations_biological(payload, outputs)
-        return {"outputs": outputs, "recommendations": recs}
+        return self._predict_response("biological", request_json)
 
     @bentoml.api
     def tertiary(self, request_json: dict) -> dict:
-        payload = _unwrap_payload(request_json)
-        x = _build_feature_array(payload, TER_FEATURE_COLS)
-        y_pred = self.tertiary_model.predict(x)[0]
-        outputs = dict(zip(TER_TARGET_COLS, y_pred))
-        recs = generate_recommendations_tertiary(payload, outputs)
-        return {"outputs": outputs, "recommendations": recs}
+        return self._predict_response("tertiary", request_json)
+
+    @bentoml.api
+    def cache_stats(self) -> dict:
+        if self.cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.cache.stats()}
+
+    @bentoml.api
+    def startup_stats(self) -> dict:
+        return self.startup
+
+    @bentoml.api
+    def warmstart_stats(self) -> dict:
+        if self.warm_index is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.warm_index.stats()}
+
+    @bentoml.api
+    def pool_stats(self) -> dict:
+        return {"predict": self.predict_pool.stats(), "optimize": self.optimize_pool.stats()}
+
+    # ---------- async endpoints (bounded offload, 503 when full) ----------
+    @bentoml.api
+    async def primary_async(self, request_json: dict) -> dict:
+        return await self.predict_pool.run(self._predict_response, "primary", request_json)
+
+    @bentoml.api
+    async def biological_async(self, request_json: dict) -> dict:
+        return await self.predict_pool.run(self._predict_response, "biological", request_json)
+
+    @bentoml.api
+    async def tertiary_async(self, request_json: dict) -> dict:
+        return await self.predict_pool.run(self._predict_response, "tertiary", request_json)
+
+    @bentoml.api
+    async def primary_optimize_async(self, request_json: dict) -> dict:
+        return await self.optimize_pool.run(self._optimize_response, "primary", request_json)
+
+    @bentoml.api
+    async def biological_optimize_async(self, request_json: dict) -> dict:
+        return await self.optimize_pool.run(self._optimize_response, "biological", request_json)
+
+    @bentoml.api
+    async def tertiary_optimize_async(self, request_json: dict) -> dict:
+        return await self.optimize_pool.run(self._optimize_response, "tertiary", request_json)
+
+    # ---------- batch endpoints ----------
+    def _predict_items(self, stage: str, payloads: List[dict]) -> List[dict]:
+        # one model.predict and one rule-table pass for the whole list
+        if not payloads:
+            return []
+        spec = STAGES[stage]
+        target_cols = spec["target_cols"]
+        start = time.perf_counter()
+        x = _build_feature_matrix(payloads, spec["feature_cols"])
+        _observe_phase(stage, "build", start)
+        y_pred = self._predict(stage, x, cached=True)
+        recs = generate_recommendations_batch(stage, payloads, _columns(y_pred, target_cols))
+        return [{"outputs": dict(zip(target_cols, y_row)), "recommendations": rec}
+                for y_row, rec in zip(y_pred, recs)]
+
+    def _batch_response(self, stage: str, request_json: dict) -> dict:
+        items = _batch_items(_unwrap_payload(request_json))
+        start = time.perf_counter()
+        results = self._predict_items(stage, items)
+        elapsed = time.perf_counter() - start
+        return {
+            "stage": stage,
+            "num_items": len(results),
+            "results": results,
+            "elapsed_ms": elapsed * 1000.0,
+            "throughput_items_per_s": _throughput(len(results), elapsed),
+        }
+
+    def _batchable(self, stage: str, request_jsons: List[dict]) -> List[dict]:
+        payloads = [_unwrap_payload(r) for r in request_jsons]
+        start = time.perf_counter()
+        results = self._predict_items(stage, payloads)
+        elapsed = time.perf_counter() - start
+        logger.info("%s adaptive batch: %d items in %.1f ms (%.0f items/s)",
+                    stage, len(results), elapsed * 1000.0, _throughput(len(results), elapsed))
+        return results
+
+    @bentoml.api
+    def primary_batch(self, request_json: dict) -> dict:
+        return self._batch_response("primary", request_json)
+
+    @bentoml.api
+    def biological_batch(self, request_json: dict) -> dict:
+        return self._batch_response("biological", request_json)
+
+    @bentoml.api
+    def tertiary_batch(self, request_json: dict) -> dict:
+        return self._batch_response("tertiary", request_json)
+
+    @bentoml.api(batchable=True, max_batch_size=BATCH_MAX_SIZE, max_latency_ms=BATCH_MAX_LATENCY_MS)
+    def primary_batchable(self, request_jsons: List[dict]) -> List[dict]:
+        return self._batchable("primary", request_jsons)
+
+    @bentoml.api(batchable=True, max_batch_size=BATCH_MAX_SIZE, max_latency_ms=BATCH_MAX_LATENCY_MS)
+    def biological_batchable(self, request_jsons: List[dict]) -> List[dict]:
+        return self._batchable("biological", request_jsons)
+
+    @bentoml.api(batchable=True, max_batch_size=BATCH_MAX_SIZE, max_latency_ms=BATCH_MAX_LATENCY_MS)
+    def tertiary_batchable(self, request_jsons: List[dict]) -> List[dict]:
+        return self._batchable("tertiary", request_jsons)
+
+    # ---------- treatment train (all three models, arrays end to end) ----------
+    def _pipeline_items(self, payloads: List[dict]) -> List[dict]:
+        """
+        Each payload: {"primary": {...}, "biological": {...}, "tertiary": {...}}. Stages run
+        on feature matrices for the whole list; downstream influent columns come from the
+        upstream outputs (PIPELINE_LINKS) or inputs (PIPELINE_CARRY).
+        """
+        if not payloads:
+            return []
+        for i, p in enumerate(payloads):
+            if not isinstance(p, dict):
+                raise InvalidArgument(f"pipeline item {i} must be an object")
+        stage_payloads = {stage: [_unwrap_payload(p.get(stage, {})) for p in payloads] for stage in PIPELINE_ORDER}
+        for stage, rows in stage_payloads.items():
+            for i, row in enumerate(rows):
+                if not isinstance(row, dict):
+                    raise InvalidArgument(f"pipeline item {i} '{stage}' must be an object")
+        xs, ys, linked = {}, {}, {}
+        for stage in PIPELINE_ORDER:
+            spec = STAGES[stage]
+            rows = stage_payloads[stage]
+            x = _build_feature_matrix(rows, spec["feature_cols"])
+            if stage != PIPELINE_ORDER[0]:
+                up = PIPELINE_ORDER[PIPELINE_ORDER.index(stage) - 1]
+                linked[stage] = _chain_inputs(stage, x, lambda key: np.array([key in r for r in rows], dtype=bool), xs[up], ys[up])
+            xs[stage] = x
+            ys[stage] = self._predict(stage, x, cached=True)
+
+        energy = _plant_energy(ys)
+        results = [{} for _ in payloads]
+        for stage in PIPELINE_ORDER:
+            spec = STAGES[stage]
+            col = {c: j for j, c in enumerate(spec["feature_cols"])}
+            inputs = []
+            for i, row in enumerate(stage_payloads[stage]):
+                chained = {k: float(xs[stage][i, col[k]]) for k, mask in linked.get(stage, {}).items() if mask[i]}
+                inputs.append({**row, **chained})
+                if chained:
+                    results[i].setdefault("linked_inputs", {})[stage] = chained
+            recs = generate_recommendations_batch(stage, inputs, _columns(ys[stage], spec["target_cols"]))
+            for i, (y_row, rec) in enumerate(zip(ys[stage], recs)):
+                results[i][stage] = {"outputs": dict(zip(spec["target_cols"], y_row)), "recommendations": rec}
+
+        q_col = PRIMARY_FEATURE_COLS.index("Q_in_mld")
+        for i, result in enumerate(results):
+            result["energy_kwh_day"] = {k: float(v[i]) for k, v in energy.items()}
+            result["energy_per_m3"] = energy_per_m3(float(energy["total"][i]), float(xs["primary"][i, q_col]))
+        return results
+
+    @bentoml.api
+    def pipeline(self, request_json: dict) -> dict:
+        return self._pipeline_items([_unwrap_payload(request_json)])[0]
+
+    @bentoml.api
+    def pipeline_batch(self, request_json: dict) -> dict:
+        items = _batch_items(_unwrap_payload(request_json))
+        start = time.perf_counter()
+        results = self._pipeline_items(items)
+        elapsed = time.perf_counter() - start
+        return {
+            "num_items": len(results),
+            "results": results,
+            "elapsed_ms": elapsed * 1000.0,
+            "throughput_items_per_s": _throughput(len(results), elapsed),
+        }
 
     # ---------- progressive search helper (used by optimizers) ----------
-    def _progressive_search(self, run_fn, base_inputs: dict, mode: str, n_samples: int, top_k: int, feasible_check):
+    def _progressive_search(self, run_fn, base_inputs: dict, mode: str, n_samples: int, top_k: int, prior=None):
         """
-        run_fn(scale) -> list of candidates with keys inputs, outputs, score
+        run_fn(scale) -> CandidateFrame (inputs, outputs, score, feasibility per candidate)
+        prior: already evaluated CandidateFrame (warm start) that counts toward the narrow phase
         progressive strategy:
           - narrow search scale
           - if enough feasible -> return top_k feasible
@@ -534,190 +2333,832 @@ class AquaSmartService:
           - else return best overall candidates but mark infeasible + reasons
         """
         # narrow
-        narrow_cands = run_fn(scale=0.25, n_samples=n_samples)
-        feasible_narrow = [c for c in narrow_cands if feasible_check(c["outputs"])]
-        if len(feasible_narrow) >= top_k:
-            feasible_narrow.sort(key=lambda c: c["score"], reverse=True)
-            return [{"inputs": c["inputs"], "outputs": c["outputs"], "score": c["score"], "feasible": True} for c in feasible_narrow[:top_k]]
+        if prior is None:
+            narrow = run_fn(scale=0.25, n_samples=n_samples)
+        else:
+            narrow = type(prior).concat([prior, run_fn(scale=0.25, n_samples=max(0, n_samples - len(prior)))])
+        if int(narrow.feasible.sum()) >= top_k:
+            _count(SEARCH_OUTCOMES, 1, narrow.stage, "narrow")
+            return self._select_top_k(narrow, top_k)
 
         # wide
-        wide_cands = run_fn(scale=0.6, n_samples=n_samples)
-        feasible_wide = [c for c in wide_cands if feasible_check(c["outputs"])]
-        combined_feasible = sorted(feasible_narrow + feasible_wide, key=lambda c: c["score"], reverse=True)
-        if len(combined_feasible) >= top_k:
-            return [{"inputs": c["inputs"], "outputs": c["outputs"], "score": c["score"], "feasible": True} for c in combined_feasible[:top_k]]
+        _count(SEARCH_OUTCOMES, 1, narrow.stage, "wide")
+        wide = run_fn(scale=0.6, n_samples=n_samples)
+        return self._select_top_k(type(narrow).concat([narrow, wide]), top_k)
 
-        if combined_feasible:
-            return [{"inputs": c["inputs"], "outputs": c["outputs"], "score": c["score"], "feasible": True} for c in combined_feasible[:min(len(combined_feasible), top_k)]]
+    def _select_top_k(self, frame, top_k: int):
+        """
+        top_k feasible candidates by score; if none are feasible, the best overall
+        candidates marked infeasible with feasibility_fail_reasons.
+        Only the selected rows are turned into dicts.
+        """
+        start = time.perf_counter()
+        feasible_idx = frame.top(top_k, frame.feasible)
+        if len(feasible_idx):
+            out = [dict(c, feasible=True) for c in frame.records(feasible_idx)]
+            _observe_phase(frame.stage, "select", start)
+            return out
 
         # no feasible - return best overall but mark infeasible and include failure reasons
-        all_cands = sorted(narrow_cands + wide_cands, key=lambda c: c["score"], reverse=True)[:top_k]
-
-        def failed_reasons_primary(outputs: dict) -> List[str]:
-            reasons = []
-            if outputs.get("BOD5_final_mgL", np.inf) > 60.0:
-                reasons.append(f"BOD5_final_mgL={outputs['BOD5_final_mgL']:.2f} > 60")
-            if outputs.get("COD_final_mgL", np.inf) > 150.0:
-                reasons.append(f"COD_final_mgL={outputs['COD_final_mgL']:.2f} > 150")
-            if outputs.get("TSS_final_mgL", np.inf) > 30.0:
-                reasons.append(f"TSS_final_mgL={outputs['TSS_final_mgL']:.2f} > 30")
-            return reasons
-
-        def failed_reasons_bio(outputs: dict) -> List[str]:
-            reasons = []
-            if outputs.get("BOD_final_bio_mgL", np.inf) > 50.0:
-                reasons.append(f"BOD_final_bio_mgL={outputs['BOD_final_bio_mgL']:.2f} > 50")
-            if outputs.get("COD_final_bio_mgL", np.inf) > 150.0:
-                reasons.append(f"COD_final_bio_mgL={outputs['COD_final_bio_mgL']:.2f} > 150")
-            if outputs.get("NH4_final_mgL", np.inf) > 5.0:
-                reasons.append(f"NH4_final_mgL={outputs['NH4_final_mgL']:.2f} > 5")
-            return reasons
-
-        def failed_reasons_ter(outputs: dict) -> List[str]:
-            reasons = []
-            if outputs.get("turbidity_final_NTU", np.inf) > 3.0:
-                reasons.append(f"turbidity_final_NTU={outputs['turbidity_final_NTU']:.2f} > 3")
-            if outputs.get("Ecoli_final_CFU_100mL", np.inf) > 100.0:
-                reasons.append(f"Ecoli_final_CFU_100mL={outputs['Ecoli_final_CFU_100mL']:.2f} > 100")
-            if outputs.get("COD_final_ter_mgL", np.inf) > 80.0:
-                reasons.append(f"COD_final_ter_mgL={outputs['COD_final_ter_mgL']:.2f} > 80")
-            if outputs.get("micropollutant_final_ugL", np.inf) > 0.5:
-                reasons.append(f"micropollutant_final_ugL={outputs['micropollutant_final_ugL']:.3f} > 0.5")
-            return reasons
-
         out = []
-        for c in all_cands:
-            reasons = []
-            # choose appropriate reasoner based on feasible_check identity
-            if feasible_check == primary_feasible:
-                reasons = failed_reasons_primary(c["outputs"])
-            elif feasible_check == bio_feasible:
-                reasons = failed_reasons_bio(c["outputs"])
+        for c in frame.records(frame.top(top_k)):
+            out.append(dict(c, feasible=False, feasibility_fail_reasons=frame.fail_reasons(c)))
+        _observe_phase(frame.stage, "select", start)
+        return out
+
+    # ---------- OPTIMIZERS (use progressive_search) ----------
+    def _evaluate_samples(self, stage: str, base_inputs: dict, sample_bounds: dict, samples, mode: str, robust=None):
+        # one predict for the whole sample matrix, scored as arrays
+        spec = STAGES[stage]
+        if robust is not None:
+            return self._evaluate_robust(stage, base_inputs, sample_bounds, samples, mode, robust)
+        if len(samples):
+            start = time.perf_counter()
+            x = _build_candidate_matrix(base_inputs, spec["feature_cols"], list(sample_bounds), samples)
+            _observe_phase(stage, "build", start)
+            y_pred = self._predict(stage, x)
+        else:
+            y_pred = np.empty((0, len(spec["target_cols"])))
+        return CandidateFrame.evaluate(stage, base_inputs, sample_bounds, samples, y_pred, mode)
+
+    def _evaluate_robust(self, stage: str, base_inputs: dict, sample_bounds: dict, samples, mode: str, robust: dict):
+        """
+        Candidates x scenarios as one stacked feature matrix (candidate-major: every
+        candidate's rows are repeated once per scenario and the scenario columns
+        overwritten), so the whole tensor is a single predict call.
+        """
+        spec = STAGES[stage]
+        values = robust["values"]
+        n_scen = len(values)
+        if len(samples):
+            start = time.perf_counter()
+            x = np.repeat(_build_candidate_matrix(base_inputs, spec["feature_cols"], list(sample_bounds), samples), n_scen, axis=0)
+            col_index = {col: i for i, col in enumerate(spec["feature_cols"])}
+            x[:, [col_index[k] for k in robust["keys"]]] = np.tile(values, (len(samples), 1))
+            _observe_phase(stage, "build", start)
+            y_pred = self._predict(stage, x)
+        else:
+            y_pred = np.empty((0, len(spec["target_cols"])))
+        return RobustFrame.evaluate(stage, base_inputs, sample_bounds, samples, y_pred, mode, robust=robust)
+
+    def _run_candidates(self, stage: str, base_inputs: dict, mode: str, scale: float, n_samples: int, seed_seq,
+                        sampler: str = "random", screening=None, robust=None):
+        """
+        Batched candidate evaluation. Candidates are drawn in seeded shards of OPT_SHARD_SIZE;
+        the shards are split into one contiguous group per worker and each group is scored
+        with a single model.predict call. Results keep shard order.
+        """
+        return self._evaluate_shards(stage, base_inputs, mode, scale, _shard_plan(n_samples, seed_seq), sampler=sampler,
+                                     screening=screening, robust=robust)
+
+    def _surrogate(self, stage: str, fidelity: float) -> CompiledEnsemble:
+        # the stage model compiled once (unless it already is) and cut to the first stages
+        with self._surrogate_lock:
+            full = self._surrogates.get((stage, None))
+            if full is None:
+                model = getattr(self, f"{stage}_model")
+                try:
+                    full = model if isinstance(model, CompiledEnsemble) else compile_ensemble(model)
+                except (TypeError, ValueError) as e:
+                    raise InvalidArgument(f"{stage} model does not support screening: {e}")
+                self._surrogates[(stage, None)] = full
+            n_stages = max(1, int(round(fidelity * full.n_stages)))
+            engine = self._surrogates.get((stage, n_stages))
+            if engine is None:
+                engine = self._surrogates[(stage, n_stages)] = full.truncated(n_stages)
+            return engine
+
+    def _screen_samples(self, stage: str, base_inputs: dict, sample_bounds: dict, samples, sizes, mode: str, screening: dict):
+        """
+        Score samples with the truncated surrogate and keep the best `keep` fraction of each
+        shard (feasible before infeasible, then by score; ties keep candidate order).
+        Selection is per shard so the kept set does not depend on the worker count.
+        """
+        start = time.perf_counter()
+        spec = STAGES[stage]
+        x = _build_candidate_matrix(base_inputs, spec["feature_cols"], list(sample_bounds), samples)
+        cols = _columns(self._surrogate(stage, screening["fidelity"]).predict(x), spec["target_cols"])
+        scores = _as_column(spec["objective"](cols, mode=mode), len(x), float)
+        feasible = _as_column(spec["feasible"](cols), len(x), bool)
+        fitness = np.where(feasible, scores, scores - 100.0)
+        kept = []
+        offset = 0
+        for size in sizes:
+            keep = max(1, int(np.ceil(screening["keep"] * size)))
+            order = np.argsort(-fitness[offset:offset + size], kind="stable")[:keep]
+            kept.append(offset + np.sort(order))
+            offset += size
+        _observe_phase(stage, "screen", start)
+        return samples[np.concatenate(kept)] if kept else samples
+
+    def _evaluate_shards(self, stage: str, base_inputs: dict, mode: str, scale: float, shards: list, sampler: str = "random",
+                         screening=None, robust=None):
+        spec = STAGES[stage]
+        sample_bounds = _sample_bounds(base_inputs, spec["bounds"], spec["fixed_keys"])
+        if not shards:
+            return self._evaluate_samples(stage, base_inputs, sample_bounds, np.empty((0, len(sample_bounds))), mode,
+                                          robust=robust)
+
+        def run_group(group):
+            start = time.perf_counter()
+            parts = [sample_configs_around(base_inputs, sample_bounds, size, scale=scale, rng=np.random.default_rng(seq),
+                                           sampler=sampler)[1]
+                     for seq, size in group]
+            _observe_phase(stage, "sample", start)
+            samples = np.vstack(parts)
+            if screening is not None:
+                samples = self._screen_samples(stage, base_inputs, sample_bounds, samples, [len(p) for p in parts], mode, screening)
+            return self._evaluate_samples(stage, base_inputs, sample_bounds, samples, mode, robust=robust)
+
+        n_groups = min(len(shards), OPT_WORKERS) if self.opt_pool is not None else 1
+        groups = [g for g in np.array_split(np.arange(len(shards)), n_groups) if len(g)]
+        if len(groups) == 1:
+            return run_group(shards)
+        futures = [self.opt_pool.submit(run_group, [shards[i] for i in g]) for g in groups]
+        frames = [f.result() for f in futures]
+        return type(frames[0]).concat(frames)
+
+    def _warm_seeds(self, stage: str, base_inputs: dict, mode: str, info: dict):
+        """
+        Nearest stored optima for this influent as a [n, len(sample bounds)] matrix, or None.
+        Settings missing from a stored entry fall back to the current config (or bounds midpoint).
+        """
+        if self.warm_index is None:
+            return None
+        values, dist = self.warm_index.nearest(stage, mode, base_inputs)
+        info["warm_start"] = {"neighbors": len(values), "nearest_distance": float(dist[0]) if len(dist) else None}
+        if not len(values):
+            return None
+        spec = STAGES[stage]
+        sample_bounds = _sample_bounds(base_inputs, spec["bounds"], spec["fixed_keys"])
+        col = {k: j for j, k in enumerate(spec["bounds"])}
+        seeds = np.empty((len(values), len(sample_bounds)))
+        for j, (key, (low, high)) in enumerate(sample_bounds.items()):
+            fallback = base_inputs.get(key)
+            fallback = (low + high) / 2.0 if fallback is None else float(fallback)
+            seeds[:, j] = np.where(np.isnan(values[:, col[key]]), fallback, values[:, col[key]])
+        return seeds
+
+    def _warm_frame(self, stage: str, base_inputs: dict, mode: str, seeds: np.ndarray, rng, robust=None):
+        # each neighbour plus WARMSTART_PER_SEED - 1 candidates tightly around it
+        spec = STAGES[stage]
+        sample_bounds = _sample_bounds(base_inputs, spec["bounds"], spec["fixed_keys"])
+        keys = list(sample_bounds)
+        parts = []
+        for seed_row in seeds:
+            around = sample_configs_around(dict(zip(keys, seed_row)), sample_bounds, WARMSTART_PER_SEED - 1,
+                                           scale=WARMSTART_SCALE, rng=rng)[1]
+            parts.append(np.vstack([seed_row[None, :], around]))
+        return self._evaluate_samples(stage, base_inputs, sample_bounds, np.vstack(parts), mode, robust=robust)
+
+    def _remember(self, stage: str, base_inputs: dict, mode: str, best: List[dict]) -> None:
+        if self.warm_index is not None:
+            self.warm_index.add(stage, mode, base_inputs, [c for c in best if c["feasible"]])
+
+    def _cem_search(self, stage: str, base_inputs: dict, mode: str, top_k: int, max_evals: int, population: int, rng, info: dict,
+                    deadline=None, warm=None, robust=None):
+        """
+        Cross-entropy method over the stage's OPT_BOUNDS, normalized to [0, 1].
+        Each generation refits a diagonal Gaussian to the elite candidates (feasible first,
+        then by score); warm (seed rows in bounds order) moves the starting mean to the
+        nearest stored optimum. Stops when max_evals is spent, the deadline (perf_counter) has passed
+        after at least one generation, or the best elite score has not improved by CEM_TOL
+        for CEM_PATIENCE generations.
+        """
+        spec = STAGES[stage]
+        bounds = _sample_bounds(base_inputs, spec["bounds"], spec["fixed_keys"])
+        keys = list(bounds.keys())
+        low = np.array([bounds[k][0] for k in keys], dtype=float)
+        span = np.array([bounds[k][1] - bounds[k][0] for k in keys], dtype=float)
+        is_int = np.array([_is_int_bound(*bounds[k]) for k in keys], dtype=bool)
+
+        # start from the current config (global midpoint for missing keys)
+        start = [(float(base_inputs[k]) - bounds[k][0]) / (bounds[k][1] - bounds[k][0]) if base_inputs.get(k) is not None else 0.5 for k in keys]
+        if warm is not None:
+            start = (warm[0] - low) / span
+        mean = np.clip(np.array(start, dtype=float), 0.0, 1.0)
+        sigma = np.full(len(keys), CEM_INIT_SIGMA)
+
+        archive = []
+        evaluations = 0
+        best = -np.inf
+        stall = 0
+        generations = 0
+        stopped = "budget"
+        generation_s = 0.0
+        while evaluations < max_evals:
+            t0 = time.perf_counter()
+            # a generation that would end past the deadline is not started
+            if deadline is not None and generations and t0 + generation_s >= deadline:
+                stopped = "deadline"
+                break
+            n = min(population, max_evals - evaluations)
+            u = np.clip(mean + sigma * rng.standard_normal((n, len(keys))), 0.0, 1.0)
+            samples = low + u * span
+            samples[:, is_int] = np.rint(samples[:, is_int])
+            _observe_phase(stage, "sample", t0)
+            frame = self._evaluate_samples(stage, base_inputs, bounds, samples, mode, robust=robust)
+            archive.append(frame)
+            evaluations += n
+            generations += 1
+            generation_s = time.perf_counter() - t0
+
+            # infeasible candidates rank below every feasible one (scores are 0..100)
+            fitness = np.where(frame.feasible, frame.scores, frame.scores - 100.0)
+            n_elite = min(n, max(2, int(np.ceil(CEM_ELITE_FRAC * n))))
+            elite = np.argsort(fitness)[::-1][:n_elite]
+            u_elite = (samples[elite] - low) / span
+            mean = (1.0 - CEM_SMOOTHING) * mean + CEM_SMOOTHING * u_elite.mean(axis=0)
+            sigma = np.maximum((1.0 - CEM_SMOOTHING) * sigma + CEM_SMOOTHING * u_elite.std(axis=0), CEM_MIN_SIGMA)
+
+            if fitness[elite[0]] > best + CEM_TOL:
+                best = fitness[elite[0]]
+                stall = 0
             else:
-                reasons = failed_reasons_ter(c["outputs"])
+                stall += 1
+                if stall >= CEM_PATIENCE:
+                    stopped = "converged"
+                    break
+
+        info.update({"evaluations": evaluations, "generations": generations, "stopped": stopped})
+        if not archive:
+            archive.append(self._evaluate_samples(stage, base_inputs, bounds, np.empty((0, len(keys))), mode, robust=robust))
+        return self._select_top_k(type(archive[0]).concat(archive), top_k)
+
+    def _optimize(self, stage: str, base_inputs: dict, mode: str, n_samples: int, top_k: int, seed=None,
+                  algorithm: str = "random", max_evals=None, population: int = CEM_POPULATION, info=None,
+                  time_budget_ms=None, warm_start: bool = False, sampler: str = "random", screening=None, robust=None):
+        """
+        sampler picks how the random search draws candidates (OPT_SAMPLERS); cem ignores it.
+        screening ({"fidelity", "keep"}) pre-scores the random search's candidates with a
+        truncated ensemble and runs the full model only on the kept fraction.
+        warm_start seeds the search from the nearest stored optima for this influent
+        (random: evaluated first and counted toward the narrow phase; cem: starting mean).
+        Feasible results are always added to the index, except for robust runs (their
+        "feasible" is a scenario pass share, which would mislead nominal searches).
+        robust (from _robust_options) scores every candidate under every influent scenario:
+        score is the worst-case / mean / percentile objective and feasible means the share of
+        passing scenarios reaches min_pass_share. Screening still uses the current influent.
+
+        time_budget_ms makes the search anytime: candidates are evaluated chunk by chunk
+        and no new chunk starts unless it is expected (from the previous chunk's duration)
+        to finish before the deadline; the first chunk always runs. The top_k is then
+        picked from everything evaluated so far; info reports evaluations and budget_exhausted.
+        """
+        info = info if info is not None else {}
+        info["algorithm"] = algorithm
+        seed_seq = np.random.SeedSequence(seed)
+        deadline = None
+        if time_budget_ms is not None:
+            if time_budget_ms <= 0:
+                raise InvalidArgument("time_budget_ms must be positive")
+            deadline = time.perf_counter() + time_budget_ms / 1000.0
+        seeds = self._warm_seeds(stage, base_inputs, mode, info) if warm_start else None
+        if robust is not None:
+            info["robust"] = {"scenarios": len(robust["values"]), "keys": robust["keys"], "objective": robust["objective"],
+                              "min_pass_share": robust["min_pass_share"]}
+        if algorithm == "cem":
+            # same worst-case budget as the narrow + wide random search
+            budget = max_evals if max_evals is not None else 2 * n_samples
+            best = self._cem_search(stage, base_inputs, mode, top_k, budget, population, np.random.default_rng(seed_seq), info,
+                                    deadline=deadline, warm=seeds, robust=robust)
+            if deadline is not None:
+                info["budget_exhausted"] = info["stopped"] == "deadline"
+            if robust is None:
+                self._remember(stage, base_inputs, mode, best)
+            return best
+        if algorithm != "random":
+            raise InvalidArgument(f"unknown algorithm '{algorithm}', expected one of {OPT_ALGORITHMS}")
+        if sampler not in OPT_SAMPLERS:
+            raise InvalidArgument(f"unknown sampler '{sampler}', expected one of {OPT_SAMPLERS}")
+        info["sampler"] = sampler
+        if screening is not None:
+            info["screening"] = {**screening, "screened": 0}
+
+        info["evaluations"] = 0
+        if deadline is not None:
+            info["budget_exhausted"] = False
+        last_chunk_s = [0.0]
 
-            out.append({
+        def run_fn(scale: float, n_samples: int):
+            # each phase gets its own child seed
+            seq = seed_seq.spawn(1)[0]
+            if deadline is None:
+                if screening is not None:
+                    info["screening"]["screened"] += n_samples
+                frame = self._run_candidates(stage, base_inputs, mode, scale, n_samples, seq, sampler=sampler, screening=screening,
+                                             robust=robust)
+                # with screening only the rows that got the full model count as evaluations
+                info["evaluations"] += len(frame)
+                return frame
+            # same shards as _run_candidates, one pool-wide group at a time until the deadline
+            shards = _shard_plan(n_samples, seq)
+            step = OPT_WORKERS if self.opt_pool is not None else 1
+            frames = []
+            for i in range(0, len(shards), step):
+                now = time.perf_counter()
+                if info["evaluations"] and now + last_chunk_s[0] >= deadline:
+                    info["budget_exhausted"] = True
+                    break
+                frames.append(self._evaluate_shards(stage, base_inputs, mode, scale, shards[i:i + step], sampler=sampler,
+                                                    screening=screening, robust=robust))
+                info["evaluations"] += len(frames[-1])
+                if screening is not None:
+                    info["screening"]["screened"] += sum(size for _, size in shards[i:i + step])
+                last_chunk_s[0] = time.perf_counter() - now
+            if not frames:
+                return self._evaluate_shards(stage, base_inputs, mode, scale, [], robust=robust)
+            return type(frames[0]).concat(frames)
+
+        prior = None
+        if seeds is not None:
+            prior = self._warm_frame(stage, base_inputs, mode, seeds, np.random.default_rng(seed_seq.spawn(1)[0]), robust=robust)
+            info["evaluations"] += len(prior)
+        best = self._progressive_search(run_fn, base_inputs, mode, n_samples, top_k, prior=prior)
+        if robust is None:
+            self._remember(stage, base_inputs, mode, best)
+        return best
+
+    def _optimize_primary(self, base_inputs: dict, mode: str, n_samples: int, top_k: int, **kwargs):
+        return self._optimize("primary", base_inputs, mode, n_samples, top_k, **kwargs)
+
+    def _optimize_biological(self, base_inputs: dict, mode: str, n_samples: int, top_k: int, **kwargs):
+        return self._optimize("biological", base_inputs, mode, n_samples, top_k, **kwargs)
+
+    def _optimize_tertiary(self, base_inputs: dict, mode: str, n_samples: int, top_k: int, **kwargs):
+        return self._optimize("tertiary", base_inputs, mode, n_samples, top_k, **kwargs)
+
+    # ---------- STREAMING OPTIMIZATION ----------
+    async def _optimize_stream(self, stage: str, request_json: dict) -> AsyncGenerator[str, None]:
+        """
+        Progressive (random) search evaluated in chunks of shards, yielding one JSON line per
+        chunk with the current top_k (feasibility_fail_reasons while nothing is feasible)
+        and a final line identical in content to *_optimize for the same seed.
+        Closing the stream cancels the remaining chunks.
+        """
+        payload = _unwrap_payload(request_json)
+        current = payload.get("current_config", {})
+        mode = payload.get("mode", "balanced")
+        n_samples = int(payload.get("n_samples", 100))
+        top_k = int(payload.get("top_k", 5))
+        seed = payload.get("seed", None)
+        sampler = payload.get("sampler", "random")
+        shards_per_chunk = max(1, int(payload.get("chunk_size", OPT_SHARD_SIZE)) // OPT_SHARD_SIZE)
+        if sampler not in OPT_SAMPLERS:
+            raise InvalidArgument(f"unknown sampler '{sampler}', expected one of {OPT_SAMPLERS}")
+        seed_seq = np.random.SeedSequence(seed)
+        start = time.perf_counter()
+
+        evaluated = []
+        best = []
+        for phase, scale in (("narrow", 0.25), ("wide", 0.6)):
+            # same child seeds as _optimize, so the final answer matches the non-streaming endpoint
+            shards = _shard_plan(n_samples, seed_seq.spawn(1)[0])
+            phase_frames = []
+            for i in range(0, len(shards), shards_per_chunk):
+                chunk = shards[i:i + shards_per_chunk]
+                phase_frames.append(await asyncio.to_thread(self._evaluate_shards, stage, current, mode, scale, chunk, sampler))
+                so_far = CandidateFrame.concat(evaluated + phase_frames)
+                best = self._select_top_k(so_far, top_k)
+                yield json.dumps({
+                    "event": "progress",
+                    "phase": phase,
+                    "evaluated": len(so_far),
+                    "elapsed_ms": (time.perf_counter() - start) * 1000.0,
+                    "feasible_found": bool(best) and best[0]["feasible"],
+                    "candidates": best,
+                }) + "\n"
+            evaluated += phase_frames
+            if phase == "narrow" and sum(int(f.feasible.sum()) for f in phase_frames) >= top_k:
+                break
+
+        _attach_recommendations(stage, best)
+        yield json.dumps({
+            "event": "final",
+            "stage": stage,
+            "mode": mode,
+            "evaluated": sum(len(f) for f in evaluated),
+            "elapsed_ms": (time.perf_counter() - start) * 1000.0,
+            "num_candidates": len(best),
+            "candidates": best,
+        }) + "\n"
+
+    @bentoml.api
+    async def primary_optimize_stream(self, request_json: dict) -> AsyncGenerator[str, None]:
+        async for line in self._optimize_stream("primary", request_json):
+            yield line
+
+    @bentoml.api
+    async def biological_optimize_stream(self, request_json: dict) -> AsyncGenerator[str, None]:
+        async for line in self._optimize_stream("biological", request_json):
+            yield line
+
+    @bentoml.api
+    async def tertiary_optimize_stream(self, request_json: dict) -> AsyncGenerator[str, None]:
+        async for line in self._optimize_stream("tertiary", request_json):
+            yield line
+
+    # ---------- PARETO (efficiency vs. energy) ----------
+    def _pareto_response(self, stage: str, request_json: dict) -> dict:
+        payload = _unwrap_payload(request_json)
+        current = payload.get("current_config", {})
+        n_samples = int(payload.get("n_samples", 200))
+        max_points = int(payload.get("max_points", 20))
+        seed = payload.get("seed", None)
+        include_recs = bool(payload.get("include_recommendations", True))
+        spec = STAGES[stage]
+        narrow_seq, wide_seq = np.random.SeedSequence(seed).spawn(2)
+
+        # one pool (narrow + wide, same work as a full progressive search) serves every weighting
+        pool = CandidateFrame.concat([
+            self._run_candidates(stage, current, "balanced", 0.25, n_samples, narrow_seq),
+            self._run_candidates(stage, current, "balanced", 0.6, n_samples, wide_seq),
+        ])
+        cols = _columns(pool.y, spec["target_cols"])
+        eff = _as_column(spec["efficiency_metric"](cols), len(pool), float)
+        eng = _as_column(spec["energy_metric"](cols), len(pool), float)
+        feasible = pool.feasible
+
+        # front over feasible candidates; if none are feasible, over everything (marked infeasible)
+        candidates = np.flatnonzero(feasible) if feasible.any() else np.arange(len(pool))
+        front = candidates[pareto_front_2d(eff[candidates], eng[candidates])]
+        front = front[_spread_subset(len(front), max_points)]
+
+        records = pool.records(front)
+        if include_recs:
+            _attach_recommendations(stage, records)
+        points = []
+        for i, c in zip(front, records):
+            point = {
                 "inputs": c["inputs"],
                 "outputs": c["outputs"],
-                "score": c["score"],
-                "feasible": False,
-                "feasibility_fail_reasons": reasons
-            })
-        return out
+                "efficiency_metric": float(eff[i]),
+                "energy_metric": float(eng[i]),
+                "scores": {m: spec["objective"](c["outputs"], mode=m) for m in OPT_MODES},
+                "feasible": bool(feasible[i]),
+            }
+            if not feasible[i]:
+                point["feasibility_fail_reasons"] = _failed_reasons(spec["feasible"], c["outputs"])
+            if include_recs:
+                point["recommendations"] = c["recommendations"]
+            points.append(point)
+        return {
+            "stage": stage,
+            "num_evaluated": len(pool),
+            "num_feasible": int(feasible.sum()),
+            "num_points": len(points),
+            "front": points,
+        }
 
-    # ---------- OPTIMIZERS (use progressive_search) ----------
+    @bentoml.api
+    def primary_pareto(self, request_json: dict) -> dict:
+        return self._pareto_response("primary", request_json)
 
-    def _optimize_primary(self, base_inputs: dict, mode: str, n_samples: int, top_k: int):
-        def run_fn(scale: float, n_samples: int):
-            cands = []
-            for _ in range(n_samples):
-                cand_inputs = sample_config_around(base_inputs, PRIMARY_OPT_BOUNDS, scale=scale)
-                # keep influent/contaminant & fixed items constant (not allowed to vary)
-                fixed_keys = [
-                    "Q_in_mld", "temp_C", "pH",
-                    "TSS_in_mgL", "BOD5_in_mgL", "COD_in_mgL",
-                    "oil_grease_in_mgL", "peak_factor",
-                    "screen_type", "grit_type", "clarifier_type",
-                    "screen_angle_deg", "side_water_depth_m",
-                    "weir_length_m", "saturator_retention_time_min",
-                ]
-                for fk in fixed_keys:
-                    if fk in base_inputs:
-                        cand_inputs[fk] = base_inputs[fk]
-
-                x = _build_feature_array(cand_inputs, PRIMARY_FEATURE_COLS)
-                y_pred = self.primary_model.predict(x)[0]
-                outputs = dict(zip(PRIMARY_TARGET_COLS, y_pred))
-                score = primary_objective(outputs, mode=mode)
-                cands.append({"inputs": cand_inputs, "outputs": outputs, "score": score})
-            return cands
-
-        return self._progressive_search(run_fn, base_inputs, mode, n_samples, top_k, primary_feasible)
-
-    def _optimize_biological(self, base_inputs: dict, mode: str, n_samples: int, top_k: int):
-        def run_fn(scale: float, n_samples: int):
-            cands = []
-            for _ in range(n_samples):
-                cand_inputs = sample_config_around(base_inputs, BIO_OPT_BOUNDS, scale=scale)
-                # preserve influent/contamination keys
-                fixed_keys = [
-                    "Q_bio_mld", "temp_C", "pH",
-                    "TSS_in_bio_mgL", "BOD5_in_bio_mgL", "COD_in_bio_mgL",
-                    "NH4_in_mgL", "NO3_in_mgL", "F_M_ratio_kgkgd",
-                ]
-                for fk in fixed_keys:
-                    if fk in base_inputs:
-                        cand_inputs[fk] = base_inputs[fk]
-
-                x = _build_feature_array(cand_inputs, BIO_FEATURE_COLS)
-                y_pred = self.biological_model.predict(x)[0]
-                outputs = dict(zip(BIO_TARGET_COLS, y_pred))
-                score = bio_objective(outputs, mode=mode)
-                cands.append({"inputs": cand_inputs, "outputs": outputs, "score": score})
-            return cands
-
-        return self._progressive_search(run_fn, base_inputs, mode, n_samples, top_k, bio_feasible)
-
-    def _optimize_tertiary(self, base_inputs: dict, mode: str, n_samples: int, top_k: int):
-        def run_fn(scale: float, n_samples: int):
-            cands = []
-            for _ in range(n_samples):
-                cand_inputs = sample_config_around(base_inputs, TER_OPT_BOUNDS, scale=scale)
-                fixed_keys = [
-                    "Q_ter_mld", "temp_C", "pH_bulk",
-                    "TSS_after_bio_mgL", "turbidity_in_NTU",
-                    "BOD_in_ter_mgL", "COD_in_ter_mgL",
-                    "NH4_in_ter_mgL", "NO3_in_ter_mgL", "TP_in_ter_mgL",
-                    "Ecoli_in_CFU_100mL", "micropollutant_in_ugL",
-                    "flux_LMH",
-                ]
-                for fk in fixed_keys:
-                    if fk in base_inputs:
-                        cand_inputs[fk] = base_inputs[fk]
-
-                x = _build_feature_array(cand_inputs, TER_FEATURE_COLS)
-                y_pred = self.tertiary_model.predict(x)[0]
-                outputs = dict(zip(TER_TARGET_COLS, y_pred))
-                score = ter_objective(outputs, mode=mode)
-                cands.append({"inputs": cand_inputs, "outputs": outputs, "score": score})
-            return cands
-
-        return self._progressive_search(run_fn, base_inputs, mode, n_samples, top_k, ter_feasible)
+    @bentoml.api
+    def biological_pareto(self, request_json: dict) -> dict:
+        return self._pareto_response("biological", request_json)
 
-    # ---------- PUBLIC OPTIMIZATION ENDPOINTS ----------
     @bentoml.api
-    def primary_optimize(self, request_json: dict) -> dict:
+    def tertiary_pareto(self, request_json: dict) -> dict:
+        return self._pareto_response("tertiary", request_json)
+
+    # ---------- WHAT-IF SWEEP (1-D / 2-D grid, one predict) ----------
+    def _sweep_response(self, stage: str, request_json: dict) -> dict:
+        """
+        Evaluate a grid over one or two OPT_BOUNDS keys around current_config.
+        Every per-point result is an array shaped like the grid (axis order as given),
+        so a 2-D sweep returns outputs[col][i][j] for axes[0].values[i], axes[1].values[j].
+        """
         payload = _unwrap_payload(request_json)
         current = payload.get("current_config", {})
         mode = payload.get("mode", "balanced")
-        n_samples = int(payload.get("n_samples", 100))
-        top_k = int(payload.get("top_k", 5))
-        best = self._optimize_primary(current, mode, n_samples, top_k)
-        # ensure recommendations attached
-        for c in best:
-            c.setdefault("recommendations", generate_recommendations_primary(c["inputs"], c["outputs"]))
-        return {"stage": "primary", "mode": mode, "num_candidates": len(best), "candidates": best}
+        axes_req = payload.get("axes", [])
+        spec = STAGES[stage]
+        if not isinstance(axes_req, list) or not 1 <= len(axes_req) <= 2:
+            raise InvalidArgument("sweep needs one or two axes")
+        axes = [_sweep_axis(stage, axis) for axis in axes_req]
+        if len(axes) == 2 and axes[0][0] == axes[1][0]:
+            raise InvalidArgument(f"sweep axes must be different keys, got '{axes[0][0]}' twice")
+        targets = payload.get("targets") or spec["target_cols"]
+        unknown = [t for t in targets if t not in spec["target_cols"]]
+        if unknown:
+            raise InvalidArgument(f"unknown {stage} targets {unknown}")
+        shape = tuple(len(values) for _, values in axes)
+        n_points = int(np.prod(shape))
+        if n_points > SWEEP_MAX_POINTS:
+            raise InvalidArgument(f"sweep grid has {n_points} points, limit is {SWEEP_MAX_POINTS}")
+
+        start = time.perf_counter()
+        grids = np.meshgrid(*[values for _, values in axes], indexing="ij")
+        samples = np.column_stack([g.ravel() for g in grids])
+        x = _build_candidate_matrix(current, spec["feature_cols"], [key for key, _ in axes], samples)
+        y = self._predict(stage, x)
+        cols = _columns(y, spec["target_cols"])
+        score = _as_column(spec["objective"](cols, mode=mode), n_points, float)
+        feasible = _as_column(spec["feasible"](cols), n_points, bool)
+        eff = _as_column(spec["efficiency_metric"](cols), n_points, float)
+        eng = _as_column(spec["energy_metric"](cols), n_points, float)
+        return {
+            "stage": stage,
+            "mode": mode,
+            "axes": [{"key": key, "values": values.tolist()} for key, values in axes],
+            "shape": list(shape),
+            "outputs": {t: cols[t].reshape(shape).tolist() for t in targets},
+            "score": score.reshape(shape).tolist(),
+            "feasible": feasible.reshape(shape).tolist(),
+            "efficiency_metric": eff.reshape(shape).tolist(),
+            "energy_metric": eng.reshape(shape).tolist(),
+            "elapsed_ms": (time.perf_counter() - start) * 1000.0,
+        }
 
     @bentoml.api
-    def biological_optimize(self, request_json: dict) -> dict:
+    def primary_sweep(self, request_json: dict) -> dict:
+        return self._sweep_response("primary", request_json)
+
+    @bentoml.api
+    def biological_sweep(self, request_json: dict) -> dict:
+        return self._sweep_response("biological", request_json)
+
+    @bentoml.api
+    def tertiary_sweep(self, request_json: dict) -> dict:
+        return self._sweep_response("tertiary", request_json)
+
+    # ---------- PUBLIC OPTIMIZATION ENDPOINTS ----------
+    def _optimize_response(self, stage: str, request_json: dict) -> dict:
         payload = _unwrap_payload(request_json)
         current = payload.get("current_config", {})
         mode = payload.get("mode", "balanced")
         n_samples = int(payload.get("n_samples", 100))
         top_k = int(payload.get("top_k", 5))
-        best = self._optimize_biological(current, mode, n_samples, top_k)
-        for c in best:
-            c.setdefault("recommendations", generate_recommendations_biological(c["inputs"], c["outputs"]))
-        return {"stage": "biological", "mode": mode, "num_candidates": len(best), "candidates": best}
+        seed = payload.get("seed", None)
+        algorithm = payload.get("algorithm", "random")
+        max_evals = payload.get("max_evals", None)
+        population = payload.get("population", CEM_POPULATION)
+        if isinstance(population, bool) or not isinstance(population, (int, float)) or not population >= 1 \
+                or not np.isfinite(population) or population != int(population):
+            raise InvalidArgument("population must be a positive integer")
+        population = int(population)
+        time_budget_ms = payload.get("time_budget_ms", None)
+        warm_start = payload.get("warm_start", WARMSTART_DEFAULT)
+        if isinstance(warm_start, str) and warm_start.lower() in ("true", "false"):
+            warm_start = warm_start.lower() == "true"
+        if not isinstance(warm_start, bool):
+            raise InvalidArgument("warm_start must be true or false")
+        sampler = payload.get("sampler", "random")
+        screening = _screening_options(payload.get("screening"))
+        robust = _robust_options(stage, current, payload.get("robust"), seed=seed)
+        info = {}
+        start = time.perf_counter()
+        best = self._optimize(stage, current, mode, n_samples, top_k, seed=seed, algorithm=algorithm,
+                              max_evals=int(max_evals) if max_evals is not None else None,
+                              population=population, info=info,
+                              time_budget_ms=float(time_budget_ms) if time_budget_ms is not None else None,
+                              warm_start=warm_start, sampler=sampler, screening=screening, robust=robust)
+        if time_budget_ms is not None:
+            info["time_budget_ms"] = float(time_budget_ms)
+            info["elapsed_ms"] = (time.perf_counter() - start) * 1000.0
+        # ensure recommendations attached
+        _attach_recommendations(stage, best)
+        return {"stage": stage, "mode": mode, "num_candidates": len(best), "candidates": best, "search": info}
+
+    @bentoml.api
+    def primary_optimize(self, request_json: dict) -> dict:
+        return self._optimize_response("primary", request_json)
+
+    @bentoml.api
+    def biological_optimize(self, request_json: dict) -> dict:
+        return self._optimize_response("biological", request_json)
 
     @bentoml.api
     def tertiary_optimize(self, request_json: dict) -> dict:
+        return self._optimize_response("tertiary", request_json)
+
+    # ---------- WHOLE-PLANT OPTIMIZER ----------
+    def _evaluate_plant_samples(self, base_inputs: dict, stage_bounds: dict, samples, mode: str) -> PlantFrame:
+        """
+        samples: [n, all sampled keys] in PIPELINE_ORDER blocks. One predict per stage for
+        the whole batch; each downstream matrix takes its influent columns from the upstream
+        batch (_chain_inputs), then the plant is scored and checked as arrays.
+        """
+        n = len(samples)
+        xs, ys, cols = {}, {}, {}
+        offset = 0
+        for stage in PIPELINE_ORDER:
+            spec = STAGES[stage]
+            keys = list(stage_bounds[stage])
+            payload = base_inputs[stage]
+            if n:
+                start = time.perf_counter()
+                x = _build_candidate_matrix(payload, spec["feature_cols"], keys, samples[:, offset:offset + len(keys)])
+                if stage != PIPELINE_ORDER[0]:
+                    up = PIPELINE_ORDER[PIPELINE_ORDER.index(stage) - 1]
+                    _chain_inputs(stage, x, lambda key, payload=payload: key in payload, xs[up], ys[up])
+                _observe_phase("plant", "build", start)
+                xs[stage], ys[stage] = x, self._predict(stage, x)
+            else:
+                ys[stage] = np.empty((0, len(spec["target_cols"])))
+            cols[stage] = _columns(ys[stage], spec["target_cols"])
+            offset += len(keys)
+
+        start = time.perf_counter()
+        scores = _as_column(plant_objective(cols, _plant_energy(ys)["total"], mode=mode), n, float)
+        feasible = _as_column(plant_feasible(cols), n, bool)
+        _observe_phase("plant", "score", start)
+        _count(CANDIDATES_EVALUATED, n, "plant")
+        _count(CANDIDATES_FEASIBLE, int(feasible.sum()), "plant")
+        y = np.hstack([ys[stage] for stage in PIPELINE_ORDER])
+        return PlantFrame("plant", base_inputs, PlantFrame.qualify(stage_bounds), samples, y, scores, feasible)
+
+    def _evaluate_plant_shards(self, base_inputs: dict, stage_bounds: dict, mode: str, scale: float, shards: list,
+                               sampler: str = "random") -> PlantFrame:
+        # same shard/group layout as _evaluate_shards; each shard draws its three stage blocks from one rng
+        def run_group(group):
+            start = time.perf_counter()
+            parts = []
+            for seq, size in group:
+                rng = np.random.default_rng(seq)
+                parts.append(np.hstack([
+                    sample_configs_around(base_inputs[stage], stage_bounds[stage], size, scale=scale, rng=rng, sampler=sampler)[1]
+                    for stage in PIPELINE_ORDER
+                ]))
+            _observe_phase("plant", "sample", start)
+            samples = np.vstack(parts) if parts else np.empty((0, sum(len(b) for b in stage_bounds.values())))
+            return self._evaluate_plant_samples(base_inputs, stage_bounds, samples, mode)
+
+        n_groups = min(len(shards), OPT_WORKERS) if self.opt_pool is not None else 1
+        groups = [g for g in np.array_split(np.arange(len(shards)), n_groups) if len(g)]
+        if len(groups) <= 1:
+            return run_group(shards)
+        futures = [self.opt_pool.submit(run_group, [shards[i] for i in g]) for g in groups]
+        return PlantFrame.concat([f.result() for f in futures])
+
+    def _optimize_plant(self, base_inputs: dict, mode: str, n_samples: int, top_k: int, seed=None,
+                        sampler: str = "random", info=None) -> List[dict]:
+        """
+        Joint search over PRIMARY_/BIO_/TER_OPT_BOUNDS (fixed keys given in a stage payload
+        stay fixed). Candidates run through the chained stage models in batches and are
+        ranked by plant_objective among those passing plant_feasible, with the same
+        narrow -> wide progression as the per-stage random search.
+        """
+        info = info if info is not None else {}
+        info["algorithm"] = "random"
+        info["sampler"] = sampler
+        info["evaluations"] = 0
+        stage_bounds = {
+            stage: _sample_bounds(base_inputs[stage], STAGES[stage]["bounds"], STAGES[stage]["fixed_keys"])
+            for stage in PIPELINE_ORDER
+        }
+        seed_seq = np.random.SeedSequence(seed)
+
+        def run_fn(scale, n_samples):
+            info["evaluations"] += n_samples
+            shards = _shard_plan(n_samples, seed_seq.spawn(1)[0])
+            return self._evaluate_plant_shards(base_inputs, stage_bounds, mode, scale, shards, sampler=sampler)
+
+        return self._progressive_search(run_fn, base_inputs, mode, n_samples, top_k)
+
+    def _plant_optimize_response(self, request_json: dict) -> dict:
+        # current_config: {"primary": {...}, "biological": {...}, "tertiary": {...}}
         payload = _unwrap_payload(request_json)
         current = payload.get("current_config", {})
+        base_inputs = {stage: _unwrap_payload(current.get(stage, {})) for stage in PIPELINE_ORDER}
         mode = payload.get("mode", "balanced")
-        n_samples = int(payload.get("n_samples", 100))
+        n_samples = int(payload.get("n_samples", 1000))
         top_k = int(payload.get("top_k", 5))
-        best = self._optimize_tertiary(current, mode, n_samples, top_k)
+        seed = payload.get("seed", None)
+        sampler = payload.get("sampler", "random")
+        info = {}
+        start = time.perf_counter()
+        best = self._optimize_plant(base_inputs, mode, n_samples, top_k, seed=seed, sampler=sampler, info=info)
+        info["elapsed_ms"] = (time.perf_counter() - start) * 1000.0
+
+        for stage in PIPELINE_ORDER:
+            _attach_recommendations(stage, [c["stages"][stage] for c in best])
         for c in best:
-            c.setdefault("recommendations", generate_recommendations_tertiary(c["inputs"], c["outputs"]))
-        return {"stage": "tertiary", "mode": mode, "num_candidates": len(best), "candidates": best}
+            energy = {stage: float(sum(c["stages"][stage]["outputs"][col] for col in cols))
+                      for stage, cols in PLANT_ENERGY_COLS.items()}
+            energy["total"] = sum(energy[stage] for stage in PLANT_ENERGY_COLS)
+            c["energy_kwh_day"] = energy
+            c["energy_per_m3"] = energy_per_m3(energy["total"], float(c["stages"]["primary"]["inputs"].get("Q_in_mld", 0.0)))
+        return {"mode": mode, "num_candidates": len(best), "candidates": best, "search": info}
+
+    @bentoml.api
+    def plant_optimize(self, request_json: dict) -> dict:
+        return self._plant_optimize_response(request_json)
+
+    # ---------- TIME-SERIES SIMULATION ----------
+    def _simulate(self, stages, settings: dict, payload: dict) -> dict:
+        """
+        Replay an influent timeseries (or diurnal profile) against fixed settings for one
+        stage or the chained train. Timesteps are evaluated SIM_CHUNK_ROWS at a time, one
+        predict per stage per chunk; energy, flow and violation counts are accumulated per
+        chunk and only the target columns are kept (float32) for the percentiles.
+        Timeseries keys apply to every simulated stage that has that feature.
+        """
+        percentiles = payload.get("percentiles", SIM_PERCENTILES)
+        if not isinstance(percentiles, (list, tuple)):
+            raise InvalidArgument("percentiles must be a list of numbers")
+        percentiles = [_robust_number(q, "percentiles") for q in percentiles]
+        if any(not 0.0 <= q <= 100.0 for q in percentiles):
+            raise InvalidArgument("percentiles must be in [0, 100]")
+
+        def base_value(key):
+            return next((settings[stage][key] for stage in stages if key in settings[stage]), None)
+
+        feature_cols = {col for stage in stages for col in STAGES[stage]["feature_cols"]}
+        n_steps, step_h, columns = _simulation_plan(payload, base_value, feature_cols)
+        start_t = time.perf_counter()
+        targets = {stage: np.empty((n_steps, len(STAGES[stage]["target_cols"])), dtype=np.float32) for stage in stages}
+        energy_kwh = {stage: 0.0 for stage in stages}
+        peak_kwh_day = {stage: 0.0 for stage in stages}
+        violations = {stage: 0 for stage in stages}
+        plant_violations = 0
+        total_peak = 0.0
+        volume_m3 = 0.0
+        for start in range(0, n_steps, SIM_CHUNK_ROWS):
+            stop = min(start + SIM_CHUNK_ROWS, n_steps)
+            cols = columns(start, stop)
+            xs, ys = {}, {}
+            ok = np.ones(stop - start, dtype=bool)
+            rate = np.zeros(stop - start)
+            for stage in stages:
+                spec = STAGES[stage]
+                payload_s = settings[stage]
+                x = np.repeat(_build_feature_array(payload_s, spec["feature_cols"]), stop - start, axis=0)
+                col_index = {c: j for j, c in enumerate(spec["feature_cols"])}
+                for key, values in cols.items():
+                    if key in col_index:
+                        j = col_index[key]
+                        x[:, j] = np.where(np.isnan(values), x[:, j], values)
+                if stage != stages[0]:
+                    up = stages[stages.index(stage) - 1]
+                    _chain_inputs(stage, x, lambda key, payload_s=payload_s: key in payload_s or key in cols, xs[up], ys[up])
+                xs[stage], ys[stage] = x, self._predict(stage, x)
+                targets[stage][start:stop] = ys[stage]
+
+                out = _columns(ys[stage], spec["target_cols"])
+                stage_ok = _as_column(spec["feasible"](out), stop - start, bool)
+                violations[stage] += int((~stage_ok).sum())
+                ok &= stage_ok
+                stage_rate = sum(out[c] for c in PLANT_ENERGY_COLS[stage])
+                energy_kwh[stage] += float(stage_rate.sum()) * step_h / 24.0
+                peak_kwh_day[stage] = max(peak_kwh_day[stage], float(stage_rate.max()))
+                rate = rate + stage_rate
+            plant_violations += int((~ok).sum())
+            total_peak = max(total_peak, float(rate.max()))
+            q = xs[stages[0]][:, STAGES[stages[0]]["feature_cols"].index(STAGE_FLOW_COLS[stages[0]])]
+            volume_m3 += float(q.sum()) * 1000.0 * step_h / 24.0
+        elapsed = time.perf_counter() - start_t
+
+        days = n_steps * step_h / 24.0
+        total_kwh = sum(energy_kwh.values())
+        result = {
+            "steps": n_steps,
+            "timestep_h": step_h,
+            "days": days,
+            "energy_kwh": total_kwh,
+            "energy_kwh_day": total_kwh / days,
+            "peak_energy_kwh_day": total_peak,
+            "energy_per_m3": total_kwh / volume_m3 if volume_m3 > 0 else None,
+            "volume_m3": volume_m3,
+            "violation_hours": plant_violations * step_h,
+            "stages": {},
+        }
+        for stage in stages:
+            pct = np.percentile(targets[stage], percentiles, axis=0)
+            result["stages"][stage] = {
+                "energy_kwh": energy_kwh[stage],
+                "energy_kwh_day": energy_kwh[stage] / days,
+                "peak_energy_kwh_day": peak_kwh_day[stage],
+                "violation_hours": violations[stage] * step_h,
+                "percentiles": {
+                    col: {f"p{q:g}": float(pct[i, j]) for i, q in enumerate(percentiles)}
+                    for j, col in enumerate(STAGES[stage]["target_cols"])
+                },
+            }
+        result["elapsed_ms"] = elapsed * 1000.0
+        result["throughput_steps_per_s"] = _throughput(n_steps, elapsed)
+        return result
+
+    def _simulate_response(self, stage: str, request_json: dict) -> dict:
+        payload = _unwrap_payload(request_json)
+        return {"stage": stage, **self._simulate((stage,), {stage: payload.get("settings", {})}, payload)}
+
+    @bentoml.api
+    def primary_simulate(self, request_json: dict) -> dict:
+        return self._simulate_response("primary", request_json)
+
+    @bentoml.api
+    def biological_simulate(self, request_json: dict) -> dict:
+        return self._simulate_response("biological", request_json)
+
+    @bentoml.api
+    def tertiary_simulate(self, request_json: dict) -> dict:
+        return self._simulate_response("tertiary", request_json)
+
+    @bentoml.api
+    def plant_simulate(self, request_json: dict) -> dict:
+        # settings: {"primary": {...}, "biological": {...}, "tertiary": {...}}, chained like pipeline
+        payload = _unwrap_payload(request_json)
+        settings = payload.get("settings", {})
+        return self._simulate(PIPELINE_ORDER, {stage: settings.get(stage, {}) for stage in PIPELINE_ORDER}, payload)